@@ -0,0 +1,211 @@
+import numpy as np
+from broadphase import expand_ranges
+from config import *
+
+MORTON_BITS = 16
+
+
+def spread_bits(values):
+    # Put a zero bit between each of the low 16 bits
+    v = values.astype(np.uint64)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x00FF00FF)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x0F0F0F0F)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x33333333)
+    v = (v | (v << np.uint64(1))) & np.uint64(0x55555555)
+    return v
+
+
+def monopole(dx, dy, mass, softening_sq, gravity_constant):
+    # Plummer-softened point-mass acceleration, written with plain
+    # arithmetic so the compiled kernel can reproduce it exactly.
+    r2 = dx * dx + dy * dy + softening_sq
+    safe = np.where(r2 > 0, r2, 1.0)
+    weight = np.where(r2 > 0, gravity_constant * mass / (safe * np.sqrt(safe)), 0.0)
+    return weight * dx, weight * dy
+
+
+class QuadTree:
+    def __init__(self, leaf_size: int = BARNES_HUT_LEAF_SIZE):
+        self.leaf_size = leaf_size
+        self.count = 0
+        self.order = np.zeros(0, dtype=np.intp)
+        self.pos = np.zeros((0, 2))
+        self.mass = np.zeros(0)
+        self.node_com = np.zeros((0, 2))
+        self.node_mass = np.zeros(0)
+        self.node_size = np.zeros(0)
+        self.node_start = np.zeros(0, dtype=np.intp)
+        self.node_count = np.zeros(0, dtype=np.intp)
+        self.child_start = np.zeros(0, dtype=np.intp)
+        self.child_count = np.zeros(0, dtype=np.intp)
+
+    def build(self, pos, mass, n):
+        # Linear quadtree: particles sorted by Morton code, so the nodes of
+        # every level are runs of equal code prefixes and the children of a
+        # node are a contiguous run of the next level.
+        self.count = n
+        if n == 0:
+            self.__init__(self.leaf_size)
+            return
+
+        pos = pos[:n]
+        low = pos.min(axis=0)
+        size = max(float((pos.max(axis=0) - low).max()), 1e-9) * (1 + 1e-9)
+        cells = np.clip(
+            ((pos - low) / size * (1 << MORTON_BITS)).astype(np.int64),
+            0,
+            (1 << MORTON_BITS) - 1,
+        )
+        keys = (spread_bits(cells[:, 0]) << np.uint64(1)) | spread_bits(cells[:, 1])
+
+        self.order = np.argsort(keys, kind="stable")
+        keys = keys[self.order]
+        self.pos = pos[self.order]
+        self.mass = mass[:n][self.order]
+        weighted = self.pos * self.mass[:, None]
+
+        levels = []
+        for level in range(MORTON_BITS + 1):
+            prefixes = keys >> np.uint64(2 * (MORTON_BITS - level))
+            starts = np.flatnonzero(np.diff(prefixes)) + 1
+            starts = np.concatenate(([0], starts))
+            counts = np.diff(np.append(starts, n))
+            node_mass = np.add.reduceat(self.mass, starts)
+            safe_mass = np.where(node_mass > 0, node_mass, 1.0)
+            com = np.add.reduceat(weighted, starts) / safe_mass[:, None]
+            # Massless nodes fall back to the mean position
+            empty = node_mass <= 0
+            if empty.any():
+                com[empty] = (
+                    np.add.reduceat(self.pos, starts)[empty] / counts[empty, None]
+                )
+            levels.append((prefixes[starts], starts, counts, node_mass, com))
+            if counts.max() <= self.leaf_size:
+                break
+
+        offsets = np.cumsum([0] + [len(level[1]) for level in levels])
+        child_start = []
+        child_count = []
+        for index, (prefixes, _, counts, *_) in enumerate(levels):
+            if index + 1 == len(levels):
+                child_start.append(np.zeros(len(counts), dtype=np.intp))
+                child_count.append(np.zeros(len(counts), dtype=np.intp))
+                continue
+            parents = levels[index + 1][0] >> np.uint64(2)
+            first = np.searchsorted(parents, prefixes, side="left")
+            last = np.searchsorted(parents, prefixes, side="right")
+            split = counts > self.leaf_size
+            child_start.append(np.where(split, first + offsets[index + 1], 0))
+            child_count.append(np.where(split, last - first, 0))
+
+        self.node_start = np.concatenate([level[1] for level in levels])
+        self.node_count = np.concatenate([level[2] for level in levels])
+        self.node_mass = np.concatenate([level[3] for level in levels])
+        self.node_com = np.concatenate([level[4] for level in levels])
+        self.node_size = np.concatenate(
+            [np.full(len(level[1]), size / (1 << i)) for i, level in enumerate(levels)]
+        )
+        self.child_start = np.concatenate(child_start).astype(np.intp)
+        self.child_count = np.concatenate(child_count).astype(np.intp)
+
+    def walk(self, theta: float):
+        # Walks every particle down the tree at once, one level per pass.
+        # A node far enough away (size / distance < theta) acts as a point
+        # mass, a near leaf is summed particle by particle, and any other
+        # near node is replaced by its children for the next pass. Yields
+        # each pass's (particle, far node) and (particle, near particle)
+        # interactions, in the sorted order.
+        n = self.count
+        theta_sq = theta * theta
+        targets = np.arange(n)
+        nodes = np.zeros(n, dtype=np.intp)
+
+        while len(targets):
+            dx = self.node_com[nodes, 0] - self.pos[targets, 0]
+            dy = self.node_com[nodes, 1] - self.pos[targets, 1]
+            size = self.node_size[nodes]
+            far = size * size < theta_sq * (dx * dx + dy * dy)
+            leaf = self.child_count[nodes] == 0
+
+            near = ~far & leaf
+            near_targets, sources = expand_ranges(
+                targets[near],
+                self.node_start[nodes[near]],
+                self.node_count[nodes[near]],
+            )
+            yield targets[far], nodes[far], dx[far], dy[far], near_targets, sources
+
+            opened = ~far & ~leaf
+            targets, nodes = expand_ranges(
+                targets[opened],
+                self.child_start[nodes[opened]],
+                self.child_count[nodes[opened]],
+            )
+
+    def accelerations(self, gravity_constant: float, theta: float, softening: float):
+        n = self.count
+        acc = np.zeros((n, 2))
+        if n == 0:
+            return acc
+
+        softening_sq = softening * softening
+        for far_targets, far_nodes, dx, dy, near_targets, sources in self.walk(theta):
+            fx, fy = monopole(
+                dx, dy, self.node_mass[far_nodes], softening_sq, gravity_constant
+            )
+            acc[:, 0] += np.bincount(far_targets, fx, minlength=n)
+            acc[:, 1] += np.bincount(far_targets, fy, minlength=n)
+
+            fx, fy = monopole(
+                self.pos[sources, 0] - self.pos[near_targets, 0],
+                self.pos[sources, 1] - self.pos[near_targets, 1],
+                self.mass[sources],
+                softening_sq,
+                gravity_constant,
+            )
+            acc[:, 0] += np.bincount(near_targets, fx, minlength=n)
+            acc[:, 1] += np.bincount(near_targets, fy, minlength=n)
+
+        result = np.empty_like(acc)
+        result[self.order] = acc
+        return result
+
+    def potential_energy(self, gravity_constant: float, theta: float, softening: float):
+        # Softened pairwise potential energy with the same approximation as
+        # the accelerations; each pair is seen from both ends, hence the half
+        if self.count < 2:
+            return 0.0
+
+        softening_sq = softening * softening
+        energy = 0.0
+        for far_targets, far_nodes, dx, dy, near_targets, sources in self.walk(theta):
+            r = np.sqrt(dx * dx + dy * dy + softening_sq)
+            energy -= float(self.mass[far_targets] @ (self.node_mass[far_nodes] / r))
+
+            other = sources != near_targets
+            near_targets = near_targets[other]
+            sources = sources[other]
+            diff = self.pos[sources] - self.pos[near_targets]
+            r = np.sqrt(np.einsum("ij,ij->i", diff, diff) + softening_sq)
+            safe = np.where(r > 0, r, 1.0)
+            pair = np.where(r > 0, self.mass[sources] / safe, 0.0)
+            energy -= float(self.mass[near_targets] @ pair)
+        return 0.5 * gravity_constant * energy
+
+
+def direct_accelerations(
+    pos, mass, n, gravity_constant: float, softening: float, chunk: int = 512
+):
+    # Exact O(N^2) reference for the accuracy benchmark
+    pos = pos[:n]
+    mass = mass[:n]
+    acc = np.zeros((n, 2))
+    softening_sq = softening * softening
+    for start in range(0, n, chunk):
+        end = min(start + chunk, n)
+        dx = pos[None, :, 0] - pos[start:end, None, 0]
+        dy = pos[None, :, 1] - pos[start:end, None, 1]
+        fx, fy = monopole(dx, dy, mass[None, :], softening_sq, gravity_constant)
+        acc[start:end, 0] = fx.sum(axis=1)
+        acc[start:end, 1] = fy.sum(axis=1)
+    return acc
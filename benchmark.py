@@ -0,0 +1,456 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+from simulator import PhysicsSimulator, ForceField, ParticleEmitter
+from obstacles import Obstacle
+from kernels import available_kernels
+from barnes_hut import direct_accelerations
+from vector import Vector
+from config import *
+
+SCENES = (
+    "sparse_gas",
+    "dense_pile",
+    "many_fields",
+    "emitter_heavy",
+    "self_gravity",
+    "obstacle_course",
+)
+DEFAULT_SIZES = (100, 1000, 5000)
+PARITY_TOLERANCE = 1e-9
+ACCURACY_THETAS = (0.3, 0.5, 0.7, 1.0)
+
+
+def fill_particles(simulator, rng, n, area, speed, radius_range):
+    store = simulator.particles
+    start = store.add_slots(n)
+    end = start + n
+    (x0, y0), (x1, y1) = area
+    store.pos[start:end] = rng.uniform((x0, y0), (x1, y1), (n, 2))
+    store.prev_pos[start:end] = store.pos[start:end]
+    store.vel[start:end] = rng.uniform(-speed, speed, (n, 2))
+    store.radius[start:end] = rng.uniform(*radius_range, n)
+    store.mass[start:end] = store.radius[start:end] / 5.0
+    store.color[start:end] = np.array(PARTICLE_COLORS)[
+        rng.integers(len(PARTICLE_COLORS), size=n)
+    ]
+    store.recount_mass()
+
+
+def particle_radius(n):
+    # Shrink particles with the count so every scene fits in the window.
+    area = WINDOW_WIDTH * WINDOW_HEIGHT
+    return max(0.5, min(8.0, 0.35 * np.sqrt(area / max(n, 1))))
+
+
+def build_scene(name: str, n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    simulator = PhysicsSimulator(None)
+    simulator.rng = np.random.default_rng(seed)
+    simulator.MAX_PARTICLES = max(n, simulator.MAX_PARTICLES)
+    r = particle_radius(n)
+    full = ((r, r), (WINDOW_WIDTH - r, WINDOW_HEIGHT - r))
+
+    if name == "sparse_gas":
+        simulator.settings.gravity_enabled = False
+        fill_particles(simulator, rng, n, full, 150.0, (0.5 * r, 0.8 * r))
+
+    elif name == "dense_pile":
+        floor = ((r, WINDOW_HEIGHT * 0.5), (WINDOW_WIDTH - r, WINDOW_HEIGHT - r))
+        fill_particles(simulator, rng, n, floor, 5.0, (1.2 * r, 1.5 * r))
+
+    elif name == "many_fields":
+        fill_particles(simulator, rng, n, full, 50.0, (0.5 * r, 0.8 * r))
+        for _ in range(32):
+            field_type = "ATTRACTOR" if rng.random() < 0.5 else "REPULSOR"
+            simulator.force_fields.append(
+                ForceField(
+                    Vector(*rng.uniform((0, 0), (WINDOW_WIDTH, WINDOW_HEIGHT))),
+                    float(rng.uniform(100, FORCE_FIELD_MAX_STRENGTH)),
+                    float(rng.uniform(FORCE_FIELD_MIN_RADIUS, FORCE_FIELD_MAX_RADIUS)),
+                    field_type,
+                )
+            )
+
+    elif name == "emitter_heavy":
+        fill_particles(simulator, rng, n // 2, full, 50.0, (0.5 * r, 0.8 * r))
+        for _ in range(16):
+            angle = float(rng.uniform(0, 360))
+            simulator.add_emitter(
+                ParticleEmitter(
+                    pos=Vector(*rng.uniform((50, 50), (WINDOW_WIDTH - 50, 300))),
+                    rate=EMITTER_MAX_RATE,
+                    velocity_range=(EMITTER_MIN_SPEED, EMITTER_MAX_SPEED),
+                    angle_range=(angle, angle + 45),
+                    size_range=(0.5 * r, 0.8 * r),
+                    max_particles=n,
+                )
+            )
+
+    elif name == "self_gravity":
+        # A slowly rotating disc that collapses into clumps
+        simulator.settings.gravity_enabled = False
+        simulator.settings.mutual_gravity = True
+        center = np.array((WINDOW_WIDTH / 2, WINDOW_HEIGHT / 2))
+        disc = min(WINDOW_WIDTH, WINDOW_HEIGHT) * 0.4
+        fill_particles(simulator, rng, n, full, 0.0, (0.5 * r, 0.8 * r))
+        store = simulator.particles
+        distance = disc * np.sqrt(rng.random(n))
+        angle = rng.uniform(0, 2 * np.pi, n)
+        offset = np.stack((np.cos(angle), np.sin(angle)), axis=1)
+        store.pos[:n] = center + offset * distance[:, None]
+        store.prev_pos[:n] = store.pos[:n]
+        store.vel[:n] = offset[:, ::-1] * (1, -1) * np.sqrt(distance)[:, None] * 2.0
+
+    elif name == "obstacle_course":
+        # Particles rain through 300 staggered pegs and deflectors
+        top = ((r, r), (WINDOW_WIDTH - r, WINDOW_HEIGHT * 0.25))
+        fill_particles(simulator, rng, n, top, 50.0, (0.5 * r, 0.8 * r))
+        for row in range(10):
+            y = WINDOW_HEIGHT * 0.3 + row * 38
+            for column in range(30):
+                x = 13 + column * 26 + (row % 2) * 13
+                if (row + column) % 3:
+                    simulator.add_obstacle(Obstacle("CIRCLE", [(x, y)], 3.0))
+                else:
+                    simulator.add_obstacle(
+                        Obstacle("SEGMENT", [(x - 8, y - 4), (x + 8, y + 4)])
+                    )
+
+    else:
+        raise ValueError(f"Unknown scene: {name}")
+
+    return simulator
+
+
+def timed(function, repeats: int):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats
+
+
+def measure_phases(simulator, repeats: int, render: bool):
+    store = simulator.particles
+    phases = {}
+
+    def collisions():
+        first, second = simulator.kernels.find_pairs(
+            simulator.broad_phase, store.pos, store.radius, len(store)
+        )
+        simulator.kernels.resolve_collisions(store, first, second, RESTITUTION, 1)
+
+    def force_fields():
+        simulator.apply_force_fields(simulator.force_fields)
+
+    def statistics():
+        simulator.statistics.update(simulator)
+
+    phases["collisions"] = timed(collisions, repeats)
+    phases["statistics"] = timed(statistics, repeats)
+    if simulator.force_fields:
+        phases["force_fields"] = timed(force_fields, repeats)
+    if simulator.obstacles:
+        phases["obstacles"] = timed(simulator.handle_obstacles, repeats)
+
+    if render:
+        import pygame
+        import dearpygui.dearpygui as dpg
+        from gui import GUI
+
+        simulator.screen = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT))
+        phases["draw"] = timed(simulator.draw, repeats)
+        mode = simulator.settings.render_mode
+        simulator.settings.render_mode = "heatmap"
+        phases["draw_heatmap"] = timed(simulator.draw, repeats)
+        simulator.settings.render_mode = mode
+
+        dpg.create_context()
+        try:
+            gui = GUI(simulator)
+
+            def update_stats():
+                # Force a fresh sample so every repeat rewrites the text
+                gui.stats_version = -1
+                gui.update_stats()
+
+            phases["update_stats"] = timed(update_stats, repeats)
+        finally:
+            dpg.destroy_context()
+
+    return phases
+
+
+def run_case(
+    scene: str,
+    n: int,
+    steps: int,
+    dt: float,
+    seed: int,
+    render: bool,
+    workers: int,
+    backend: str = PHYSICS_BACKEND,
+):
+    simulator = build_scene(scene, n, seed)
+    simulator.set_backend(backend)
+    simulator.settings.trails_enabled = render
+    simulator.set_parallel(workers)
+    try:
+        return measure_case(simulator, scene, n, steps, dt, render)
+    finally:
+        simulator.set_parallel(0)
+
+
+def measure_case(simulator, scene, n, steps, dt, render):
+
+    simulator.update(dt)
+    start = time.perf_counter()
+    for _ in range(steps):
+        simulator.update(dt)
+    elapsed = time.perf_counter() - start
+
+    simulator.profiler.enabled = True
+    for _ in range(max(1, steps // 4)):
+        simulator.update(dt)
+        simulator.profiler.end_frame()
+    step_phases = {
+        name: timing["mean"] for name, timing in simulator.profiler.summary().items()
+    }
+    simulator.profiler.enabled = False
+
+    phases = measure_phases(simulator, max(1, steps // 4), render)
+
+    tracemalloc.start()
+    simulator.update(dt)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    speedup = None
+    if simulator.parallel is not None:
+        speedup = simulator.parallel.measure_speedup(max(1, steps // 4))
+
+    return {
+        "scene": scene,
+        "particles": n,
+        "final_particles": len(simulator.particles),
+        "steps": steps,
+        "elapsed": elapsed,
+        "steps_per_second": steps / elapsed if elapsed > 0 else float("inf"),
+        "phases": phases,
+        "step_phases": step_phases,
+        "peak_memory_bytes": peak,
+        "parallel": speedup,
+    }
+
+
+def check_parity(scenes, sizes, steps: int, dt: float, seed: int):
+    # Every backend must reproduce the NumPy kernels step for step
+    backends = available_kernels()
+    failures = []
+
+    for scene in scenes:
+        for n in sizes:
+            states = {}
+            for backend in backends:
+                simulator = build_scene(scene, n, seed)
+                simulator.set_backend(backend)
+                simulator.settings.trails_enabled = False
+                for _ in range(steps):
+                    simulator.update(dt)
+                store = simulator.particles
+                states[backend] = (store.pos[: store.count], store.vel[: store.count])
+
+            reference = states["numpy"]
+            for backend in backends[1:]:
+                pos, vel = states[backend]
+                if pos.shape != reference[0].shape:
+                    error = float("inf")
+                else:
+                    error = max(
+                        float(np.abs(pos - reference[0]).max(initial=0.0)),
+                        float(np.abs(vel - reference[1]).max(initial=0.0)),
+                    )
+                flag = ""
+                if error > PARITY_TOLERANCE:
+                    flag = "  MISMATCH"
+                    failures.append((scene, n, backend))
+                print(f"{scene:>14} {n:>7}  {backend} vs numpy: {error:.3g}{flag}")
+
+    return failures
+
+
+def gravity_accuracy(sizes, seed: int):
+    # Barnes-Hut against exact direct summation on the self-gravity scene
+    results = []
+    for n in sizes:
+        simulator = build_scene("self_gravity", n, seed)
+        store = simulator.particles
+        settings = simulator.settings
+
+        start = time.perf_counter()
+        exact = direct_accelerations(
+            store.pos, store.mass, n, settings.gravity_constant, settings.softening
+        )
+        direct_time = time.perf_counter() - start
+        exact_norm = np.hypot(exact[:, 0], exact[:, 1])
+
+        for theta in ACCURACY_THETAS:
+            settings.theta = theta
+            store.acc[:n] = 0.0
+            simulator.apply_mutual_gravity()
+            start = time.perf_counter()
+            store.acc[:n] = 0.0
+            simulator.apply_mutual_gravity()
+            tree_time = time.perf_counter() - start
+
+            difference = np.hypot(*(store.acc[:n] - exact).T)
+            error = difference / np.maximum(exact_norm, 1e-12)
+            result = {
+                "particles": n,
+                "theta": theta,
+                "backend": simulator.kernels.name,
+                "tree_seconds": tree_time,
+                "direct_seconds": direct_time,
+                "median_error": float(np.median(error)),
+                "p99_error": float(np.percentile(error, 99)),
+                "max_error": float(error.max()),
+                # Relative to the typical force, so particles whose forces
+                # nearly cancel do not dominate
+                "rms_error": float(
+                    np.sqrt((difference**2).mean() / max((exact_norm**2).mean(), 1e-24))
+                ),
+            }
+            results.append(result)
+            print(
+                f"{n:>7}  theta {theta:.1f}  tree {tree_time * 1000:8.2f} ms"
+                f"  direct {direct_time * 1000:9.2f} ms"
+                f"  error median {result['median_error']:.2e}"
+                f"  p99 {result['p99_error']:.2e}  rms {result['rms_error']:.2e}"
+            )
+    return results
+
+
+def compare(baseline_path: str, current_path: str, threshold: float):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(current_path) as f:
+        current = json.load(f)
+
+    previous = {(r["scene"], r["particles"]): r for r in baseline["results"]}
+    regressions = []
+
+    for result in current["results"]:
+        key = (result["scene"], result["particles"])
+        if key not in previous:
+            continue
+        before = previous[key]["steps_per_second"]
+        after = result["steps_per_second"]
+        change = (after - before) / before if before else 0.0
+        flag = ""
+        if change < -threshold:
+            flag = "  REGRESSION"
+            regressions.append(key)
+        print(
+            f"{key[0]:>14} {key[1]:>7}  {before:10.1f} -> {after:10.1f} steps/s"
+            f"  ({change:+.1%}){flag}"
+        )
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the simulator hot paths.")
+    parser.add_argument("--scenes", nargs="+", default=list(SCENES), choices=SCENES)
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES))
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--dt", type=float, default=1.0 / PHYSICS_HZ)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--render", action="store_true", help="also time drawing")
+    parser.add_argument(
+        "--workers", type=int, default=0, help="collision worker processes"
+    )
+    parser.add_argument(
+        "--backend", default=PHYSICS_BACKEND, help="physics kernels: auto, numpy, numba"
+    )
+    parser.add_argument(
+        "--parity", action="store_true", help="check backends against numpy"
+    )
+    parser.add_argument(
+        "--gravity-accuracy",
+        action="store_true",
+        help="compare Barnes-Hut gravity with direct summation",
+    )
+    parser.add_argument("--output", default=None, help="write results JSON")
+    parser.add_argument(
+        "--compare", nargs=2, metavar=("BASELINE", "CURRENT"), default=None
+    )
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        regressions = compare(*args.compare, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    if args.gravity_accuracy:
+        results = gravity_accuracy(args.sizes, args.seed)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"gravity_accuracy": results}, f, indent=2)
+        return
+
+    if args.parity:
+        failures = check_parity(args.scenes, args.sizes, args.steps, args.dt, args.seed)
+        sys.exit(1 if failures else 0)
+
+    results = []
+    for scene in args.scenes:
+        for n in args.sizes:
+            result = run_case(
+                scene,
+                n,
+                args.steps,
+                args.dt,
+                args.seed,
+                args.render,
+                args.workers,
+                args.backend,
+            )
+            results.append(result)
+            phases = ", ".join(
+                f"{name} {seconds * 1000:.2f} ms"
+                for name, seconds in result["phases"].items()
+            )
+            print(
+                f"{scene:>14} {n:>7}  {result['steps_per_second']:10.1f} steps/s"
+                f"  peak {result['peak_memory_bytes'] / 1e6:.1f} MB  [{phases}]"
+            )
+            if result["parallel"]:
+                print(
+                    f"{'':>22} {result['parallel']['workers']} workers: "
+                    f"collision detection {result['parallel']['speedup']:.2f}x"
+                )
+
+    if args.output:
+        report = {
+            "meta": {
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "platform": platform.platform(),
+                "seed": args.seed,
+                "steps": args.steps,
+                "workers": args.workers,
+                "backend": args.backend,
+                "dt": args.dt,
+            },
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
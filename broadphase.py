@@ -0,0 +1,178 @@
+import numpy as np
+
+EMPTY_PAIRS = (np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp))
+
+# Half of the 3x3 neighbourhood; together with the same-cell pairs this
+# visits every pair of neighbouring cells exactly once.
+NEIGHBOR_OFFSETS = ((1, -1), (1, 0), (1, 1), (0, 1))
+
+CELL_STRIDE = 1 << 21
+
+
+def expand_ranges(owners, starts, counts):
+    total = int(counts.sum())
+    if total == 0:
+        return EMPTY_PAIRS
+
+    first = np.repeat(owners, counts)
+    run_starts = np.cumsum(counts) - counts
+    offsets = np.arange(total) - np.repeat(run_starts, counts)
+    second = np.repeat(starts, counts) + offsets
+    return first, second
+
+
+class BruteForceBroadPhase:
+    name = "brute_force"
+
+    def find_pairs(self, pos, radius, n):
+        if n < 2:
+            return EMPTY_PAIRS
+        i, j = np.triu_indices(n, 1)
+        return i.astype(np.intp), j.astype(np.intp)
+
+
+class SpatialHash:
+    def __init__(self, cell_size: float = None):
+        self.fixed_cell_size = cell_size
+        self.cell_size = cell_size
+        self.order = np.zeros(0, dtype=np.intp)
+        self.cell_keys = np.zeros(0, dtype=np.int64)
+        self.cell_starts = np.zeros(0, dtype=np.intp)
+        self.cell_counts = np.zeros(0, dtype=np.intp)
+        self.cells = np.zeros((0, 2), dtype=np.int64)
+        self.sorted_cells = np.zeros((0, 2), dtype=np.int64)
+
+    def cell_key(self, cx, cy):
+        return (cx + CELL_STRIDE // 2) * CELL_STRIDE + (cy + CELL_STRIDE // 2)
+
+    def rebuild(self, pos, radius, n, cell_size: float = None):
+        if cell_size is not None:
+            self.cell_size = cell_size
+        elif self.fixed_cell_size is not None:
+            self.cell_size = self.fixed_cell_size
+        else:
+            max_radius = float(radius[:n].max()) if n else 1.0
+            self.cell_size = max(2.0 * max_radius, 1e-6)
+
+        self.cells = np.floor(pos[:n] / self.cell_size).astype(np.int64)
+        keys = self.cell_key(self.cells[:, 0], self.cells[:, 1])
+
+        self.order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[self.order]
+        self.cell_keys, self.cell_starts, self.cell_counts = np.unique(
+            sorted_keys, return_index=True, return_counts=True
+        )
+        self.sorted_cells = self.cells[self.order]
+
+    def lookup(self, keys):
+        if len(self.cell_keys) == 0:
+            empty = np.zeros(len(keys), dtype=np.intp)
+            return empty, empty
+        slot = np.searchsorted(self.cell_keys, keys)
+        slot = np.minimum(slot, len(self.cell_keys) - 1)
+        found = self.cell_keys[slot] == keys
+        starts = np.where(found, self.cell_starts[slot], 0)
+        counts = np.where(found, self.cell_counts[slot], 0)
+        return starts, counts
+
+    def query_box(self, x0, y0, x1, y1):
+        cx = np.arange(
+            np.floor(x0 / self.cell_size), np.floor(x1 / self.cell_size) + 1
+        ).astype(np.int64)
+        cy = np.arange(
+            np.floor(y0 / self.cell_size), np.floor(y1 / self.cell_size) + 1
+        ).astype(np.int64)
+        gx, gy = np.meshgrid(cx, cy, indexing="ij")
+        starts, counts = self.lookup(self.cell_key(gx.ravel(), gy.ravel()))
+        _, ranks = expand_ranges(np.zeros(len(starts), dtype=np.intp), starts, counts)
+        return self.order[ranks]
+
+    def query_circle(self, x, y, radius):
+        return self.query_box(x - radius, y - radius, x + radius, y + radius)
+
+    def query_neighbors(self, points):
+        # Every item in the 3x3 cells around each point, as (point, item)
+        if self.cell_size is None or len(points) == 0:
+            return EMPTY_PAIRS
+        cells = np.floor(points / self.cell_size).astype(np.int64)
+        owners = np.arange(len(points))
+        all_owners = []
+        all_starts = []
+        all_counts = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                starts, counts = self.lookup(
+                    self.cell_key(cells[:, 0] + dx, cells[:, 1] + dy)
+                )
+                all_owners.append(owners)
+                all_starts.append(starts)
+                all_counts.append(counts)
+        owner, ranks = expand_ranges(
+            np.concatenate(all_owners),
+            np.concatenate(all_starts),
+            np.concatenate(all_counts),
+        )
+        return owner, self.order[ranks]
+
+
+class SpatialHashBroadPhase(SpatialHash):
+    name = "spatial_hash"
+
+    def find_pairs(self, pos, radius, n):
+        if n < 2:
+            return EMPTY_PAIRS
+
+        self.rebuild(pos, radius, n)
+
+        ranks = np.arange(n)
+        cx = self.sorted_cells[:, 0]
+        cy = self.sorted_cells[:, 1]
+
+        own_starts, own_counts = self.lookup(self.cell_key(cx, cy))
+        later = own_starts + own_counts - (ranks + 1)
+        firsts = [ranks]
+        starts = [ranks + 1]
+        counts = [later]
+
+        for dx, dy in NEIGHBOR_OFFSETS:
+            neighbor_starts, neighbor_counts = self.lookup(
+                self.cell_key(cx + dx, cy + dy)
+            )
+            firsts.append(ranks)
+            starts.append(neighbor_starts)
+            counts.append(neighbor_counts)
+
+        first, second = expand_ranges(
+            np.concatenate(firsts), np.concatenate(starts), np.concatenate(counts)
+        )
+        i = self.order[first]
+        j = self.order[second]
+        return np.minimum(i, j), np.maximum(i, j)
+
+    def pair_order(self, first, second):
+        # The permutation that puts candidates found some other way, e.g. by
+        # the parallel strips, in the order find_pairs emits them: the
+        # same-cell block, then one block per neighbour offset, each sorted
+        # by the ranks of the particle in the owning cell and its partner.
+        rank = np.empty(len(self.order), dtype=np.intp)
+        rank[self.order] = np.arange(len(self.order))
+        offset = self.cells[second] - self.cells[first]
+        blocks = np.zeros((3, 3), dtype=np.intp)
+        for block, (dx, dy) in enumerate(NEIGHBOR_OFFSETS, start=1):
+            blocks[dx + 1, dy + 1] = block
+            blocks[1 - dx, 1 - dy] = -block
+        block = blocks[offset[:, 0] + 1, offset[:, 1] + 1]
+
+        # A negative block means second owns the pair
+        swapped = (block < 0) | ((block == 0) & (rank[second] < rank[first]))
+        owner = np.where(swapped, rank[second], rank[first])
+        partner = np.where(swapped, rank[first], rank[second])
+        return np.lexsort((partner, owner, np.abs(block)))
+
+
+def create_broad_phase(name: str):
+    if name == BruteForceBroadPhase.name:
+        return BruteForceBroadPhase()
+    if name == SpatialHashBroadPhase.name:
+        return SpatialHashBroadPhase()
+    raise ValueError(f"Unknown broad phase: {name}")
@@ -0,0 +1,129 @@
+import numpy as np
+from config import *
+
+
+def independent_batches(i, j, n):
+    # Split contacts into batches in which no particle appears twice, so each
+    # batch can be written back with plain fancy indexing and the batches
+    # applied in sequence behave like resolving the pairs one at a time.
+    remaining = np.arange(len(i))
+    owner = np.empty(n, dtype=np.intp)
+    batches = []
+
+    while len(remaining):
+        owner.fill(len(i))
+        np.minimum.at(owner, i[remaining], remaining)
+        np.minimum.at(owner, j[remaining], remaining)
+        free = (owner[i[remaining]] == remaining) & (owner[j[remaining]] == remaining)
+        batches.append(remaining[free])
+        remaining = remaining[~free]
+
+    return batches
+
+
+def touching_pairs(store, first, second):
+    pos = store.pos
+    radius = store.radius
+    diff = pos[second] - pos[first]
+    dist_sq = np.einsum("ij,ij->i", diff, diff)
+    reach = radius[first] + radius[second]
+    touching = dist_sq < reach * reach
+    return first[touching], second[touching]
+
+
+def resolve_batch(store, i, j, restitution, resting_speed=0.0, slop=0.0):
+    pos = store.pos
+    vel = store.vel
+    mass_i = store.mass[i]
+    mass_j = store.mass[j]
+
+    diff = pos[j] - pos[i]
+    dist = np.hypot(diff[:, 0], diff[:, 1])
+    reach = store.radius[i] + store.radius[j]
+    touching = dist < reach
+
+    safe_dist = np.where(dist > 0, dist, 1.0)
+    normal = diff / safe_dist[:, None]
+    normal[(dist == 0) | ~touching] = 0.0
+
+    relative_vel = vel[j] - vel[i]
+    closing = np.minimum(np.einsum("ij,ij->i", relative_vel, normal), 0.0)
+    # Contacts closing slower than resting_speed do not bounce, so piles can
+    # come to rest
+    bounce = np.where(closing < -resting_speed, restitution, 0.0)
+
+    impulse = -(1 + bounce) * closing / (1 / mass_i + 1 / mass_j)
+    impulse = normal * impulse[:, None]
+    vel[i] -= impulse / mass_i[:, None]
+    vel[j] += impulse / mass_j[:, None]
+
+    overlap = np.maximum(reach - dist - slop, 0.0) / 2.0
+    separation = normal * overlap[:, None]
+    pos[i] -= separation
+    pos[j] += separation
+
+
+def resolve_static_batch(store, i, j, restitution, resting_speed=0.0, slop=0.0):
+    # Like resolve_batch, but j is immovable: it takes no impulse and i
+    # takes the whole correction.
+    pos = store.pos
+    vel = store.vel
+
+    diff = pos[j] - pos[i]
+    dist = np.hypot(diff[:, 0], diff[:, 1])
+    reach = store.radius[i] + store.radius[j]
+    touching = dist < reach
+
+    safe_dist = np.where(dist > 0, dist, 1.0)
+    normal = diff / safe_dist[:, None]
+    normal[(dist == 0) | ~touching] = 0.0
+
+    closing = np.minimum(np.einsum("ij,ij->i", -vel[i], normal), 0.0)
+    bounce = np.where(closing < -resting_speed, restitution, 0.0)
+    vel[i] += normal * ((1 + bounce) * closing)[:, None]
+
+    pos[i] -= normal * np.maximum(reach - dist - slop, 0.0)[:, None]
+
+
+def resolve_static(
+    store,
+    i,
+    j,
+    restitution: float = RESTITUTION,
+    resting_speed: float = 0.0,
+    slop: float = 0.0,
+):
+    if len(i) == 0:
+        return 0
+    for batch in independent_batches(i, j, store.count):
+        resolve_static_batch(
+            store, i[batch], j[batch], restitution, resting_speed, slop
+        )
+    return len(i)
+
+
+def resolve_collisions(
+    store,
+    first,
+    second,
+    restitution: float = RESTITUTION,
+    iterations: int = 1,
+    resting_speed: float = 0.0,
+    slop: float = 0.0,
+):
+    n = store.count
+    if n < 2 or len(first) == 0:
+        return 0
+
+    contacts = 0
+    for iteration in range(max(1, iterations)):
+        i, j = touching_pairs(store, first, second)
+        if iteration == 0:
+            contacts = len(i)
+        if len(i) == 0:
+            break
+
+        for batch in independent_batches(i, j, n):
+            resolve_batch(store, i[batch], j[batch], restitution, resting_speed, slop)
+
+    return contacts
@@ -2,12 +2,53 @@ WINDOW_WIDTH = 800
 WINDOW_HEIGHT = 600
 FPS = 60
 
+FIXED_TIMESTEP = True
+PHYSICS_HZ = 120
+MAX_SUBSTEPS = 8
+# Particle state buffers between the physics thread and the renderer in
+# pipelined mode: 2 keeps physics at most one frame ahead, 3 never blocks it
+PIPELINE_BUFFERS = 3
+
 BACKGROUND_COLOR = (20, 20, 20)
 PARTICLE_COLOR = (255, 255, 255)
 VECTOR_COLOR = (255, 0, 0)
 
 GRAVITY = 9.81 * 100
 RESTITUTION = 0.8
+# While sleeping is on: closing speed below which contacts stop bouncing
+RESTING_SPEED = 30.0
+# While sleeping is on: overlap left uncorrected so resting contacts are not
+# pushed apart every step
+CONTACT_SLOP = 0.5
+
+BROAD_PHASE = "spatial_hash"
+SLEEP_ENABLED = False
+# Averaged over SLEEP_TIME from the distance moved since the particle last
+# started to slow down, so contact correction jitter in a pile averages out.
+SLEEP_VELOCITY = 40.0
+SLEEP_TIME = 0.5
+SLEEP_MARGIN = 1.0
+# Collision passes used at least while sleeping is on: with a single pass a
+# pile more than a few layers deep keeps churning and never comes to rest
+SLEEP_COLLISION_ITERATIONS = 4
+GRAVITY_CONSTANT = 2000.0
+BARNES_HUT_THETA = 0.5
+BARNES_HUT_LEAF_SIZE = 8
+GRAVITY_SOFTENING = 5.0
+# "auto" uses the compiled kernels when numba is installed
+PHYSICS_BACKEND = "auto"
+COLLISION_ITERATIONS = 1
+
+PROFILER_ENABLED = False
+PROFILER_WINDOW = 120
+PROFILER_TRACE_LIMIT = 36000
+PROFILER_TRACE_FILE = "profile_trace"
+
+SNAPSHOT_FILE = "snapshot.npz"
+RECORDING_FILE = "trajectory.ptraj"
+STATS_REFRESH_HZ = 10
+REPLAY_CACHE_FRAMES = 256
+REPLAY_READ_AHEAD = 32
 
 GUI_WIDTH = 400
 GUI_HEIGHT = 600
@@ -22,6 +63,23 @@ PARTICLE_COLORS = [
 ]
 TRAIL_LENGTH = 50
 TRAIL_FADE = True
+VECTOR_MAX_ARROWS = 2000
+# "auto" draws a density heatmap instead of sprites above HEATMAP_THRESHOLD
+# particles; "particles" and "heatmap" force one or the other
+RENDER_MODE = "auto"
+HEATMAP_THRESHOLD = 5000
+# Side of one heatmap bin in pixels
+HEATMAP_CELL = 2
+# "density" colors bins by particle count, "speed" by mean speed
+HEATMAP_COLOR = "density"
+HEATMAP_STOPS = (
+    (30, 30, 90),
+    (0, 120, 255),
+    (0, 230, 160),
+    (255, 220, 0),
+    (255, 60, 0),
+    (255, 255, 255),
+)
 
 FORCE_FIELD_COLORS = {"ATTRACTOR": (0, 255, 0, 100), "REPULSOR": (255, 0, 0, 100)}
 FORCE_FIELD_MIN_STRENGTH = -1000
@@ -29,6 +87,12 @@ FORCE_FIELD_MAX_STRENGTH = 1000
 FORCE_FIELD_MIN_RADIUS = 50
 FORCE_FIELD_MAX_RADIUS = 200
 
+OBSTACLE_COLOR = (170, 170, 190)
+# Half the width of obstacle walls
+OBSTACLE_THICKNESS = 2.0
+OBSTACLE_MAX_THICKNESS = 20.0
+OBSTACLE_LEAF_SIZE = 4
+
 EMITTER_COLORS = [
     (255, 165, 0),
     (138, 43, 226),
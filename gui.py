@@ -5,44 +5,148 @@ import random
 from config import *
 import pygame
 from simulator import ForceField, ParticleEmitter
+from obstacles import create_obstacle
+from profiler import PHASES
+from settings import use_heatmap
+from snapshot import save_snapshot, load_snapshot
+import os
 
 
 class GUI:
-    def __init__(self, simulator):
+    def __init__(self, simulator, pipeline=None):
         self.simulator = simulator
+        self.pipeline = pipeline
+        self.stats_version = -1
         self.setup_gui()
         self.creating_field = False
         self.creating_emitter = False
+        self.creating_obstacle = False
+        self.obstacle_start = None
 
     def setup_gui(self):
+        settings = self.simulator.settings
         with dpg.window(label="Controls", pos=(0, 0)):
             with dpg.group():
                 dpg.add_checkbox(
                     label="Enable Gravity",
-                    default_value=True,
-                    callback=self.toggle_gravity,
+                    default_value=settings.gravity_enabled,
+                    callback=self.update_setting,
+                    user_data="gravity_enabled",
                 )
                 dpg.add_checkbox(
                     label="Enable Collisions",
-                    default_value=True,
-                    callback=self.toggle_collisions,
+                    default_value=settings.collision_enabled,
+                    callback=self.update_setting,
+                    user_data="collision_enabled",
                 )
 
+                with dpg.collapsing_header(label="Mutual Gravity"):
+                    dpg.add_checkbox(
+                        label="Enable Mutual Gravity",
+                        default_value=settings.mutual_gravity,
+                        callback=self.update_setting,
+                        user_data="mutual_gravity",
+                    )
+                    dpg.add_slider_float(
+                        label="Strength (G)",
+                        default_value=settings.gravity_constant,
+                        min_value=0.0,
+                        max_value=50000.0,
+                        callback=self.update_setting,
+                        user_data="gravity_constant",
+                    )
+                    dpg.add_slider_float(
+                        label="Opening Angle",
+                        default_value=settings.theta,
+                        min_value=0.1,
+                        max_value=1.5,
+                        callback=self.update_setting,
+                        user_data="theta",
+                    )
+                    dpg.add_slider_float(
+                        label="Softening",
+                        default_value=settings.softening,
+                        min_value=0.1,
+                        max_value=50.0,
+                        callback=self.update_setting,
+                        user_data="softening",
+                    )
+
+                with dpg.collapsing_header(label="Sleeping"):
+                    dpg.add_checkbox(
+                        label="Enable Sleeping",
+                        default_value=settings.sleeping,
+                        callback=self.update_setting,
+                        user_data="sleeping",
+                    )
+                    dpg.add_slider_float(
+                        label="Sleep Speed (px/s)",
+                        default_value=settings.sleep_velocity,
+                        min_value=1.0,
+                        max_value=200.0,
+                        callback=self.update_setting,
+                        user_data="sleep_velocity",
+                    )
+                    dpg.add_slider_float(
+                        label="Sleep Time (s)",
+                        default_value=settings.sleep_time,
+                        min_value=0.1,
+                        max_value=5.0,
+                        callback=self.update_setting,
+                        user_data="sleep_time",
+                    )
+
                 dpg.add_separator()
                 dpg.add_text("Vector Display")
                 dpg.add_checkbox(
                     label="Show Vectors",
-                    default_value=False,
-                    callback=self.toggle_vectors,
+                    default_value=settings.show_vectors,
+                    callback=self.update_setting,
+                    user_data="show_vectors",
                 )
                 dpg.add_slider_float(
                     label="Vector Scale",
-                    default_value=1.0,
+                    default_value=settings.vector_scale,
                     min_value=0.1,
                     max_value=5.0,
-                    callback=self.update_vector_scale,
+                    callback=self.update_setting,
+                    user_data="vector_scale",
                     tag="vector_scale",
                 )
+                dpg.add_slider_int(
+                    label="Max Arrows (0 = all)",
+                    default_value=settings.vector_limit,
+                    min_value=0,
+                    max_value=10000,
+                    callback=self.update_setting,
+                    user_data="vector_limit",
+                )
+
+                dpg.add_separator()
+                dpg.add_text("Rendering (H toggles the heatmap)")
+                dpg.add_combo(
+                    label="Render Mode",
+                    items=["auto", "particles", "heatmap"],
+                    default_value=settings.render_mode,
+                    callback=self.update_setting,
+                    user_data="render_mode",
+                    tag="render_mode",
+                )
+                dpg.add_slider_int(
+                    label="Heatmap Above",
+                    default_value=settings.heatmap_threshold,
+                    min_value=100,
+                    max_value=200000,
+                    callback=self.update_setting,
+                    user_data="heatmap_threshold",
+                )
+                dpg.add_combo(
+                    label="Heatmap Color",
+                    items=["density", "speed"],
+                    default_value=settings.heatmap_color,
+                    callback=self.update_setting,
+                    user_data="heatmap_color",
+                )
 
                 dpg.add_separator()
 
@@ -53,6 +157,17 @@ class GUI:
                     label="Clear All Particles", callback=self.clear_particles
                 )
 
+                dpg.add_separator()
+                dpg.add_text("Snapshots & Recording")
+                with dpg.group(horizontal=True):
+                    dpg.add_button(label="Save Snapshot", callback=self.save_snapshot)
+                    dpg.add_button(label="Load Snapshot", callback=self.load_snapshot)
+                dpg.add_checkbox(
+                    label="Record Trajectory",
+                    default_value=False,
+                    callback=self.toggle_recording,
+                )
+
                 dpg.add_separator()
                 dpg.add_text("Particle Properties")
 
@@ -129,6 +244,21 @@ class GUI:
                     tag="end_angle",
                 )
 
+                dpg.add_slider_float(
+                    label="Min Lifetime (s)",
+                    default_value=EMITTER_MIN_LIFETIME,
+                    min_value=EMITTER_MIN_LIFETIME,
+                    max_value=EMITTER_MAX_LIFETIME,
+                    tag="min_lifetime",
+                )
+                dpg.add_slider_float(
+                    label="Max Lifetime (s)",
+                    default_value=EMITTER_MAX_LIFETIME,
+                    min_value=EMITTER_MIN_LIFETIME,
+                    max_value=EMITTER_MAX_LIFETIME,
+                    tag="max_lifetime",
+                )
+
                 dpg.add_button(
                     label="Create Emitter (Middle Click)",
                     callback=self.toggle_emitter_creation_mode,
@@ -141,6 +271,7 @@ class GUI:
                 dpg.add_separator()
 
                 dpg.add_text("Particle Count: 0", tag="particle_count")
+                dpg.add_text("Sleeping Particles: 0", tag="sleeping_count")
                 dpg.add_text("Average Velocity: 0 px/s", tag="avg_velocity")
                 dpg.add_text("System Energy: 0 J", tag="system_energy")
 
@@ -150,6 +281,40 @@ class GUI:
                 dpg.add_text("Total Mass: 0 kg", tag="total_mass")
                 dpg.add_text("Average Mass: 0 kg", tag="avg_mass")
 
+                dpg.add_separator()
+
+                dpg.add_text("Momentum: 0 kg px/s", tag="momentum")
+                dpg.add_text("Potential Energy: 0 J", tag="potential_energy")
+                dpg.add_text("Energy Drift: 0.00 %", tag="energy_drift")
+                dpg.add_slider_float(
+                    label="Refresh Rate (Hz)",
+                    default_value=self.simulator.statistics.refresh_hz,
+                    min_value=1,
+                    max_value=60,
+                    callback=self.update_stats_refresh,
+                )
+
+                dpg.add_separator()
+
+                dpg.add_text("Physics Substeps: 0", tag="physics_substeps")
+                dpg.add_text("Dropped Time: 0.000 s", tag="dropped_time")
+
+                with dpg.collapsing_header(label="Frame Time"):
+                    dpg.add_checkbox(
+                        label="Enable Profiling",
+                        default_value=self.simulator.profiler.enabled,
+                        callback=self.toggle_profiling,
+                    )
+                    for phase in PHASES:
+                        dpg.add_text(f"{phase}: -", tag=f"phase_{phase}")
+                    with dpg.group(horizontal=True):
+                        dpg.add_button(
+                            label="Export CSV", callback=self.export_trace_csv
+                        )
+                        dpg.add_button(
+                            label="Export JSON", callback=self.export_trace_json
+                        )
+
         with dpg.window(label="Force Fields", pos=(0, 600), width=380, height=200):
             with dpg.group():
                 dpg.add_text("Force Field Controls", color=(255, 255, 0))
@@ -186,14 +351,71 @@ class GUI:
                     label="Clear All Fields", callback=self.clear_force_fields
                 )
 
-    def toggle_gravity(self, sender, app_data):
-        self.simulator.gravity_enabled = app_data
+        with dpg.window(label="Obstacles", pos=(0, 1050), width=380, height=160):
+            with dpg.group():
+                dpg.add_text("Obstacle Controls", color=(255, 255, 0))
+                dpg.add_separator()
 
-    def toggle_collisions(self, sender, app_data):
-        self.simulator.collision_enabled = app_data
+                dpg.add_combo(
+                    label="Obstacle Shape",
+                    items=["SEGMENT", "BOX", "CIRCLE"],
+                    default_value="SEGMENT",
+                    tag="obstacle_shape",
+                )
+
+                dpg.add_slider_float(
+                    label="Wall Thickness",
+                    default_value=2 * OBSTACLE_THICKNESS,
+                    min_value=1.0,
+                    max_value=2 * OBSTACLE_MAX_THICKNESS,
+                    tag="obstacle_thickness",
+                )
+
+                dpg.add_button(
+                    label="Create Obstacle (Left Drag)",
+                    callback=self.toggle_obstacle_creation_mode,
+                )
+                dpg.add_button(
+                    label="Clear All Obstacles", callback=self.clear_obstacles
+                )
+
+    def apply(self, command, *args):
+        # Anything that changes the simulation goes through here, so the
+        # pipelined loop can run it on the physics thread between steps.
+        if self.pipeline is None:
+            command(*args)
+        else:
+            self.pipeline.submit(command, *args)
+
+    def update_setting(self, sender, app_data, user_data):
+        self.apply(setattr, self.simulator.settings, user_data, app_data)
+
+    def save_snapshot(self):
+        self.apply(save_snapshot, self.simulator, SNAPSHOT_FILE)
+
+    def load_snapshot(self):
+        if os.path.exists(SNAPSHOT_FILE):
+            self.apply(load_snapshot, self.simulator, SNAPSHOT_FILE)
+
+    def toggle_recording(self, sender, app_data):
+        if app_data:
+            self.apply(self.simulator.start_recording, RECORDING_FILE)
+        else:
+            self.apply(self.simulator.stop_recording)
+
+    def toggle_profiling(self, sender, app_data):
+        self.apply(self.set_profiling, app_data)
+
+    def set_profiling(self, enabled):
+        self.simulator.profiler.enabled = enabled
+        if not enabled:
+            self.simulator.profiler.reset()
+
+    def export_trace_csv(self):
+        self.simulator.profiler.export(f"{PROFILER_TRACE_FILE}.csv")
 
-    def toggle_vectors(self, sender, app_data):
-        self.simulator.show_vectors = app_data
+    def export_trace_json(self):
+        self.simulator.profiler.export(f"{PROFILER_TRACE_FILE}.json")
 
     def add_random_particle(self):
         pos = Vector(
@@ -205,7 +427,7 @@ class GUI:
         radius = float(random.randint(10, 20))
 
         particle = Particle(pos, vel, mass, radius)
-        self.simulator.add_particle(particle)
+        self.apply(self.simulator.add_particle, particle)
 
     def add_particle_at_center(self):
         center_pos = Vector(WINDOW_WIDTH / 2, WINDOW_HEIGHT / 2)
@@ -218,23 +440,47 @@ class GUI:
         radius = mass * 5
 
         particle = Particle(center_pos, vel, mass, radius)
-        self.simulator.add_particle(particle)
+        self.apply(self.simulator.add_particle, particle)
 
     def clear_particles(self):
-        self.simulator.particles.clear()
+        self.apply(self.simulator.particles.clear)
 
-    def update_vector_scale(self, sender, app_data):
-        self.simulator.vector_scale = app_data
+    def update_stats_refresh(self, sender, app_data):
+        self.apply(setattr, self.simulator.statistics, "refresh_hz", app_data)
 
     def toggle_emitter_creation_mode(self):
         self.creating_emitter = not self.creating_emitter
 
     def clear_emitters(self):
-        self.simulator.emitters.clear()
+        self.apply(self.simulator.emitters.clear)
+
+    def toggle_heatmap(self):
+        settings = self.simulator.settings
+        showing = use_heatmap(settings, len(self.simulator.particles))
+        mode = "particles" if showing else "heatmap"
+        dpg.set_value("render_mode", mode)
+        self.apply(setattr, settings, "render_mode", mode)
 
     def handle_mouse_events(self, event):
+        if (
+            event.type == pygame.MOUSEBUTTONUP
+            and event.button == 1
+            and self.obstacle_start is not None
+        ):
+            obstacle = create_obstacle(
+                dpg.get_value("obstacle_shape"),
+                self.obstacle_start,
+                event.pos,
+                dpg.get_value("obstacle_thickness") / 2,
+            )
+            self.obstacle_start = None
+            self.apply(self.simulator.add_obstacle, obstacle)
+
         if event.type == pygame.MOUSEBUTTONDOWN:
-            if event.button == 1:
+            if event.button == 1 and self.creating_obstacle:
+                self.obstacle_start = event.pos
+
+            elif event.button == 1:
                 mouse_pos = Vector(*pygame.mouse.get_pos())
 
                 mass = dpg.get_value("mass_slider")
@@ -245,7 +491,7 @@ class GUI:
                 radius = mass * 5
 
                 particle = Particle(mouse_pos, vel, mass, radius)
-                self.simulator.add_particle(particle)
+                self.apply(self.simulator.add_particle, particle)
 
             elif event.button == 2 and self.creating_emitter:
                 mouse_pos = Vector(*pygame.mouse.get_pos())
@@ -263,8 +509,12 @@ class GUI:
                     ),
                     size_range=(3.0, 8.0),
                     max_particles=50,
+                    lifetime_range=(
+                        dpg.get_value("min_lifetime"),
+                        dpg.get_value("max_lifetime"),
+                    ),
                 )
-                self.simulator.add_emitter(emitter)
+                self.apply(self.simulator.add_emitter, emitter)
 
             elif event.button == 3 and self.creating_field:
                 mouse_pos = Vector(*pygame.mouse.get_pos())
@@ -273,39 +523,53 @@ class GUI:
                 radius = dpg.get_value("field_radius")
 
                 field = ForceField(mouse_pos, strength, radius, field_type)
-                self.simulator.force_fields.append(field)
+                self.apply(self.simulator.force_fields.append, field)
 
     def toggle_field_creation_mode(self):
         self.creating_field = not self.creating_field
 
     def clear_force_fields(self):
-        self.simulator.force_fields.clear()
-
-    def update_stats(self):
-        particles = self.simulator.particles
-        count = len(particles)
-
-        if count > 0:
-            velocities = [p.vel.magnitude() for p in particles]
-            masses = [p.mass for p in particles]
-
-            avg_vel = sum(velocities) / count
-            max_vel = max(velocities) if velocities else 0
-            total_mass = sum(masses)
-            avg_mass = total_mass / count
-
-            energy = sum(0.5 * p.mass * p.vel.magnitude() ** 2 for p in particles)
-
-            dpg.set_value("particle_count", f"Particle Count: {count}")
-            dpg.set_value("avg_velocity", f"Average Velocity: {avg_vel:.1f} px/s")
-            dpg.set_value("max_velocity", f"Max Velocity: {max_vel:.1f} px/s")
-            dpg.set_value("system_energy", f"System Energy: {energy:.1f} J")
-            dpg.set_value("total_mass", f"Total Mass: {total_mass:.1f} kg")
-            dpg.set_value("avg_mass", f"Average Mass: {avg_mass:.1f} kg")
-        else:
-            dpg.set_value("particle_count", "Particle Count: 0")
-            dpg.set_value("avg_velocity", "Average Velocity: 0 px/s")
-            dpg.set_value("max_velocity", "Max Velocity: 0 px/s")
-            dpg.set_value("system_energy", "System Energy: 0 J")
-            dpg.set_value("total_mass", "Total Mass: 0 kg")
-            dpg.set_value("avg_mass", "Average Mass: 0 kg")
+        self.apply(self.simulator.force_fields.clear)
+
+    def toggle_obstacle_creation_mode(self):
+        self.creating_obstacle = not self.creating_obstacle
+        self.obstacle_start = None
+
+    def clear_obstacles(self):
+        self.apply(self.simulator.clear_obstacles)
+
+    def update_stats(self, frame=None):
+        # The simulator samples its statistics at the refresh rate, and the
+        # text only needs rewriting when a new sample exists.
+        source = self.simulator if frame is None else frame
+        stats = source.statistics
+        if stats.version == self.stats_version:
+            return
+        self.stats_version = stats.version
+
+        dpg.set_value("physics_substeps", f"Physics Substeps: {source.last_substeps}")
+        dpg.set_value("dropped_time", f"Dropped Time: {source.dropped_time:.3f} s")
+
+        if source.profiler.enabled:
+            summary = source.profiler.summary()
+            for phase in PHASES:
+                if phase in summary:
+                    timing = summary[phase]
+                    dpg.set_value(
+                        f"phase_{phase}",
+                        f"{phase}: {timing['mean'] * 1000:.2f} ms avg, "
+                        f"{timing['p95'] * 1000:.2f} ms p95",
+                    )
+
+        dpg.set_value("particle_count", f"Particle Count: {stats.count}")
+        dpg.set_value("sleeping_count", f"Sleeping Particles: {stats.sleeping}")
+        dpg.set_value("avg_velocity", f"Average Velocity: {stats.avg_speed:.1f} px/s")
+        dpg.set_value("max_velocity", f"Max Velocity: {stats.max_speed:.1f} px/s")
+        dpg.set_value("system_energy", f"System Energy: {stats.kinetic_energy:.1f} J")
+        dpg.set_value("total_mass", f"Total Mass: {stats.total_mass:.1f} kg")
+        dpg.set_value("avg_mass", f"Average Mass: {stats.avg_mass:.1f} kg")
+        dpg.set_value("momentum", f"Momentum: {stats.momentum_magnitude():.1f} kg px/s")
+        dpg.set_value(
+            "potential_energy", f"Potential Energy: {stats.potential_energy:.1f} J"
+        )
+        dpg.set_value("energy_drift", f"Energy Drift: {stats.energy_drift * 100:.2f} %")
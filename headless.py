@@ -0,0 +1,104 @@
+import argparse
+import json
+import random
+import time
+import numpy as np
+from simulator import PhysicsSimulator
+from scene import load_scene_file, dump_state
+from snapshot import save_snapshot
+from config import *
+
+
+def run(
+    scene_path: str,
+    steps: int,
+    dt: float,
+    seed: int = None,
+    workers: int = 0,
+    record: str = None,
+    backend: str = PHYSICS_BACKEND,
+):
+    if seed is not None:
+        random.seed(seed)
+
+    simulator = PhysicsSimulator(None, backend=backend)
+    simulator.settings.trails_enabled = False
+    simulator.rng = np.random.default_rng(seed)
+    load_scene_file(simulator, scene_path)
+    simulator.set_parallel(workers)
+    if record:
+        simulator.start_recording(record)
+
+    try:
+        start = time.perf_counter()
+        for _ in range(steps):
+            simulator.update(dt)
+        elapsed = time.perf_counter() - start
+        speedup = simulator.parallel.measure_speedup() if workers else None
+    finally:
+        simulator.set_parallel(0)
+        simulator.stop_recording()
+
+    return simulator, {
+        "scene": scene_path,
+        "steps": steps,
+        "dt": dt,
+        "seed": seed,
+        "elapsed": elapsed,
+        "steps_per_second": steps / elapsed if elapsed > 0 else float("inf"),
+        "particle_count": len(simulator.particles),
+        "workers": workers,
+        "backend": simulator.kernels.name,
+        "parallel_speedup": speedup,
+        "statistics": simulator.statistics.as_dict(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a scene without a display.")
+    parser.add_argument("scene", help="scene JSON file")
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--dt", type=float, default=1.0 / PHYSICS_HZ)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(
+        "--workers", type=int, default=0, help="collision worker processes"
+    )
+    parser.add_argument(
+        "--backend", default=PHYSICS_BACKEND, help="physics kernels: auto, numpy, numba"
+    )
+    parser.add_argument("--output", default=None, help="write timing and state JSON")
+    parser.add_argument("--record", default=None, help="record a trajectory file")
+    parser.add_argument("--snapshot", default=None, help="save the final snapshot")
+    args = parser.parse_args(argv)
+
+    simulator, timing = run(
+        args.scene,
+        args.steps,
+        args.dt,
+        args.seed,
+        args.workers,
+        args.record,
+        args.backend,
+    )
+
+    print(
+        f"{timing['steps']} steps, {timing['particle_count']} particles, "
+        f"{timing['elapsed']:.3f} s ({timing['steps_per_second']:.1f} steps/s)"
+    )
+    if timing["parallel_speedup"]:
+        speedup = timing["parallel_speedup"]
+        print(
+            f"{speedup['workers']} workers: collision detection "
+            f"speedup {speedup['speedup']:.2f}x vs serial"
+        )
+
+    if args.snapshot:
+        save_snapshot(simulator, args.snapshot)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"timing": timing, "state": dump_state(simulator)}, f)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+import numpy as np
+from barnes_hut import QuadTree
+from broadphase import CELL_STRIDE, NEIGHBOR_OFFSETS, SpatialHashBroadPhase
+from collision import resolve_collisions
+from config import *
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+class NumpyKernels:
+    name = "numpy"
+
+    def find_pairs(self, broad_phase, pos, radius, n):
+        return broad_phase.find_pairs(pos, radius, n)
+
+    def integrate(self, store, dt: float):
+        store.integrate(dt)
+
+    def handle_boundaries(
+        self, store, width: float, height: float, restitution: float, resting_speed=0.0
+    ):
+        store.handle_boundaries(width, height, restitution, resting_speed)
+
+    def resolve_collisions(
+        self, store, first, second, restitution, iterations, resting_speed=0.0, slop=0.0
+    ):
+        return resolve_collisions(
+            store, first, second, restitution, iterations, resting_speed, slop
+        )
+
+    def tree_gravity(self, tree, gravity_constant, theta, softening):
+        return tree.accelerations(gravity_constant, theta, softening)
+
+
+if numba is not None:
+
+    @numba.njit(cache=True, nogil=True)
+    def integrate_kernel(pos, vel, acc, last_acc, n, dt):
+        for k in range(n):
+            for axis in range(2):
+                vel[k, axis] += acc[k, axis] * dt
+                pos[k, axis] += vel[k, axis] * dt
+                last_acc[k, axis] = acc[k, axis]
+                acc[k, axis] = 0.0
+
+    @numba.njit(cache=True, nogil=True)
+    def boundaries_kernel(
+        pos, vel, radius, n, width, height, restitution, resting_speed
+    ):
+        def reflect(v):
+            return -restitution * v if abs(v) > resting_speed else 0.0
+
+        for k in range(n):
+            r = radius[k]
+            if pos[k, 1] + r > height:
+                pos[k, 1] = height - r
+                vel[k, 1] = reflect(vel[k, 1])
+            if pos[k, 1] - r < 0:
+                pos[k, 1] = r
+                vel[k, 1] = reflect(vel[k, 1])
+            if pos[k, 0] + r > width:
+                pos[k, 0] = width - r
+                vel[k, 0] = reflect(vel[k, 0])
+            if pos[k, 0] - r < 0:
+                pos[k, 0] = r
+                vel[k, 0] = reflect(vel[k, 0])
+
+    @numba.njit(cache=True, nogil=True)
+    def lookup_cell(cell_keys, key):
+        low = 0
+        high = len(cell_keys)
+        while low < high:
+            middle = (low + high) // 2
+            if cell_keys[middle] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(cell_keys) and cell_keys[low] == key:
+            return low
+        return -1
+
+    @numba.njit(cache=True, nogil=True)
+    def spatial_pairs_kernel(
+        order, cell_keys, cell_starts, cell_counts, offsets, stride
+    ):
+        # Emits the candidates in the same order as
+        # SpatialHashBroadPhase.find_pairs: the same-cell block first, then
+        # one block per neighbour offset, each in sorted particle order.
+        # Particles of a cell share their neighbour ranges, so every cell is
+        # looked up once per block instead of once per particle.
+        cells = len(cell_keys)
+        blocks = len(offsets) + 1
+        neighbors = np.full((blocks, cells), -1, dtype=np.intp)
+        half = stride // 2
+        total = 0
+
+        for c in range(cells):
+            cx = cell_keys[c] // stride - half
+            cy = cell_keys[c] % stride - half
+            count = cell_counts[c]
+            neighbors[0, c] = c
+            total += count * (count - 1) // 2
+            for block in range(1, blocks):
+                key = (cx + offsets[block - 1, 0] + half) * stride + (
+                    cy + offsets[block - 1, 1] + half
+                )
+                slot = lookup_cell(cell_keys, key)
+                if slot >= 0:
+                    neighbors[block, c] = slot
+                    total += count * cell_counts[slot]
+
+        first = np.empty(total, dtype=np.intp)
+        second = np.empty(total, dtype=np.intp)
+        k = 0
+        for block in range(blocks):
+            for c in range(cells):
+                slot = neighbors[block, c]
+                if slot < 0:
+                    continue
+                end = cell_starts[slot] + cell_counts[slot]
+                for rank in range(cell_starts[c], cell_starts[c] + cell_counts[c]):
+                    a = order[rank]
+                    other = rank + 1 if block == 0 else cell_starts[slot]
+                    for other in range(other, end):
+                        b = order[other]
+                        first[k] = min(a, b)
+                        second[k] = max(a, b)
+                        k += 1
+
+        return first, second
+
+    @numba.njit(cache=True, nogil=True)
+    def resolve_kernel(
+        pos,
+        vel,
+        mass,
+        radius,
+        first,
+        second,
+        restitution,
+        iterations,
+        resting_speed,
+        slop,
+    ):
+        # Resolving the pairs in order gives each particle the same sequence
+        # of updates as the independent batches of the NumPy path.
+        m = len(first)
+        touching = np.empty(m, dtype=np.bool_)
+        contacts = 0
+
+        for iteration in range(max(1, iterations)):
+            found = 0
+            for k in range(m):
+                i = first[k]
+                j = second[k]
+                dx = pos[j, 0] - pos[i, 0]
+                dy = pos[j, 1] - pos[i, 1]
+                reach = radius[i] + radius[j]
+                touching[k] = dx * dx + dy * dy < reach * reach
+                if touching[k]:
+                    found += 1
+            if iteration == 0:
+                contacts = found
+            if found == 0:
+                break
+
+            for k in range(m):
+                if not touching[k]:
+                    continue
+                i = first[k]
+                j = second[k]
+                dx = pos[j, 0] - pos[i, 0]
+                dy = pos[j, 1] - pos[i, 1]
+                dist = np.hypot(dx, dy)
+                reach = radius[i] + radius[j]
+                if dist == 0 or dist >= reach:
+                    continue
+
+                nx = dx / dist
+                ny = dy / dist
+                closing = (vel[j, 0] - vel[i, 0]) * nx + (vel[j, 1] - vel[i, 1]) * ny
+                closing = min(closing, 0.0)
+                bounce = restitution if closing < -resting_speed else 0.0
+
+                impulse = -(1 + bounce) * closing / (1 / mass[i] + 1 / mass[j])
+                ix = nx * impulse
+                iy = ny * impulse
+                vel[i, 0] -= ix / mass[i]
+                vel[i, 1] -= iy / mass[i]
+                vel[j, 0] += ix / mass[j]
+                vel[j, 1] += iy / mass[j]
+
+                overlap = max(reach - dist - slop, 0.0) / 2.0
+                sx = nx * overlap
+                sy = ny * overlap
+                pos[i, 0] -= sx
+                pos[i, 1] -= sy
+                pos[j, 0] += sx
+                pos[j, 1] += sy
+
+        return contacts
+
+    @numba.njit(cache=True, nogil=True)
+    def tree_gravity_kernel(
+        pos,
+        mass,
+        node_com,
+        node_mass,
+        node_size,
+        node_start,
+        node_count,
+        child_start,
+        child_count,
+        gravity_constant,
+        theta,
+        softening_sq,
+    ):
+        # Breadth-first walk per particle, summing each level's far nodes and
+        # near leaves separately in the same order as QuadTree.accelerations,
+        # so both backends produce the same floating-point result.
+        n = len(mass)
+        theta_sq = theta * theta
+        acc = np.zeros((n, 2))
+        current = np.empty(len(node_mass), dtype=np.intp)
+        following = np.empty(len(node_mass), dtype=np.intp)
+
+        for t in range(n):
+            x = pos[t, 0]
+            y = pos[t, 1]
+            current[0] = 0
+            frontier = 0 if n == 0 else 1
+            while frontier > 0:
+                far_x = 0.0
+                far_y = 0.0
+                near_x = 0.0
+                near_y = 0.0
+                opened = 0
+                for q in range(frontier):
+                    node = current[q]
+                    dx = node_com[node, 0] - x
+                    dy = node_com[node, 1] - y
+                    size = node_size[node]
+                    if size * size < theta_sq * (dx * dx + dy * dy):
+                        r2 = dx * dx + dy * dy + softening_sq
+                        if r2 > 0:
+                            weight = (
+                                gravity_constant * node_mass[node] / (r2 * np.sqrt(r2))
+                            )
+                            far_x += weight * dx
+                            far_y += weight * dy
+                    elif child_count[node] == 0:
+                        for source in range(
+                            node_start[node], node_start[node] + node_count[node]
+                        ):
+                            dx = pos[source, 0] - x
+                            dy = pos[source, 1] - y
+                            r2 = dx * dx + dy * dy + softening_sq
+                            if r2 > 0:
+                                weight = (
+                                    gravity_constant * mass[source] / (r2 * np.sqrt(r2))
+                                )
+                                near_x += weight * dx
+                                near_y += weight * dy
+                    else:
+                        for child in range(
+                            child_start[node], child_start[node] + child_count[node]
+                        ):
+                            following[opened] = child
+                            opened += 1
+                acc[t, 0] += far_x
+                acc[t, 1] += far_y
+                acc[t, 0] += near_x
+                acc[t, 1] += near_y
+                current, following = following, current
+                frontier = opened
+
+        return acc
+
+
+class NumbaKernels:
+    name = "numba"
+    offsets = np.array(NEIGHBOR_OFFSETS, dtype=np.int64)
+
+    def __init__(self):
+        # Compile (or load from the cache) now instead of on the first frame
+        pos = np.zeros((2, 2))
+        radius = np.ones(2)
+        integrate_kernel(pos, pos.copy(), pos.copy(), pos.copy(), 2, 0.0)
+        boundaries_kernel(pos, pos.copy(), radius, 2, 1.0, 1.0, 1.0, 0.0)
+        first, second = self.find_pairs(SpatialHashBroadPhase(), pos, radius, 2)
+        resolve_kernel(pos, pos.copy(), radius, radius, first, second, 1.0, 1, 0.0, 0.0)
+        tree = QuadTree()
+        tree.build(pos, radius, 2)
+        self.tree_gravity(tree, 1.0, 0.5, 1.0)
+
+    def find_pairs(self, broad_phase, pos, radius, n):
+        if not isinstance(broad_phase, SpatialHashBroadPhase) or n < 2:
+            return broad_phase.find_pairs(pos, radius, n)
+
+        broad_phase.rebuild(pos, radius, n)
+        return spatial_pairs_kernel(
+            broad_phase.order.astype(np.intp, copy=False),
+            broad_phase.cell_keys,
+            broad_phase.cell_starts.astype(np.intp, copy=False),
+            broad_phase.cell_counts.astype(np.intp, copy=False),
+            self.offsets,
+            CELL_STRIDE,
+        )
+
+    def integrate(self, store, dt: float):
+        integrate_kernel(
+            store.pos, store.vel, store.acc, store.last_acc, store.active, dt
+        )
+
+    def handle_boundaries(
+        self, store, width: float, height: float, restitution: float, resting_speed=0.0
+    ):
+        boundaries_kernel(
+            store.pos,
+            store.vel,
+            store.radius,
+            store.active,
+            width,
+            height,
+            restitution,
+            resting_speed,
+        )
+
+    def resolve_collisions(
+        self, store, first, second, restitution, iterations, resting_speed=0.0, slop=0.0
+    ):
+        if store.count < 2 or len(first) == 0:
+            return 0
+        return resolve_kernel(
+            store.pos,
+            store.vel,
+            store.mass,
+            store.radius,
+            first.astype(np.intp, copy=False),
+            second.astype(np.intp, copy=False),
+            restitution,
+            iterations,
+            resting_speed,
+            slop,
+        )
+
+    def tree_gravity(self, tree, gravity_constant, theta, softening):
+        if tree.count == 0:
+            return np.zeros((0, 2))
+        acc = tree_gravity_kernel(
+            tree.pos,
+            tree.mass,
+            tree.node_com,
+            tree.node_mass,
+            tree.node_size,
+            tree.node_start,
+            tree.node_count,
+            tree.child_start,
+            tree.child_count,
+            float(gravity_constant),
+            float(theta),
+            float(softening * softening),
+        )
+        result = np.empty_like(acc)
+        result[tree.order] = acc
+        return result
+
+
+def available_kernels():
+    names = [NumpyKernels.name]
+    if numba is not None:
+        names.append(NumbaKernels.name)
+    return names
+
+
+def create_kernels(name: str = PHYSICS_BACKEND):
+    if name == "auto":
+        name = NumbaKernels.name if numba is not None else NumpyKernels.name
+    if name == NumpyKernels.name:
+        return NumpyKernels()
+    if name == NumbaKernels.name:
+        if numba is None:
+            raise ValueError("The numba backend needs the numba package")
+        return NumbaKernels()
+    raise ValueError(f"Unknown physics backend: {name}")
@@ -1,3 +1,4 @@
+import argparse
 import pygame
 import dearpygui.dearpygui as dpg
 from simulator import PhysicsSimulator
@@ -6,7 +7,7 @@ from config import *
 import sys
 
 
-def main():
+def run_simulation(pipelined: bool = False, buffers: int = PIPELINE_BUFFERS):
     pygame.init()
     screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
     pygame.display.set_caption("Physics Simulator")
@@ -16,12 +17,19 @@ def main():
     dpg.setup_dearpygui()
 
     simulator = PhysicsSimulator(screen)
-    gui = GUI(simulator)
+    pipeline = None
+    if pipelined:
+        from pipeline import Pipeline
+
+        pipeline = Pipeline(simulator, buffers)
+    gui = GUI(simulator, pipeline)
 
     dpg.show_viewport()
 
     running = True
     clock = pygame.time.Clock()
+    if pipeline is not None:
+        pipeline.start()
 
     while running:
         dt = clock.tick(FPS) / 1000.0
@@ -29,21 +37,131 @@ def main():
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_h:
+                gui.toggle_heatmap()
 
             gui.handle_mouse_events(event)
 
-        simulator.update(dt)
+        # Pipelined, physics steps on its own thread and this loop only
+        # draws frames it has finished; redrawing an old one would just hold
+        # the GIL the physics thread needs.
+        frame = None
+        if pipeline is None:
+            simulator.advance(dt)
+        else:
+            frame = pipeline.acquire()
+
+        if pipeline is None or frame is not None:
+            gui.update_stats(frame)
+
+            screen.fill(BACKGROUND_COLOR)
+            simulator.draw(frame)
+            # Pipelined, the physics thread ends its own frames and this one
+            # only samples the drawing
+            simulator.profiler.end_frame(trace=pipeline is None)
+            pygame.display.flip()
+
+        dpg.render_dearpygui_frame()
+
+    if pipeline is not None:
+        pipeline.stop()
+    simulator.stop_recording()
+    dpg.destroy_context()
+    pygame.quit()
+
 
-        gui.update_stats()
+def draw_timeline(screen, player):
+    height = 6
+    top = WINDOW_HEIGHT - height
+    pygame.draw.rect(screen, (60, 60, 60), (0, top, WINDOW_WIDTH, height))
+    if len(player) > 1:
+        width = int(WINDOW_WIDTH * player.index / (len(player) - 1))
+        pygame.draw.rect(screen, (200, 200, 200), (0, top, width, height))
+
+
+def handle_replay_key(player, key):
+    if key == pygame.K_SPACE:
+        player.paused = not player.paused
+    elif key == pygame.K_RIGHT:
+        player.step(1 if player.paused else 60)
+    elif key == pygame.K_LEFT:
+        player.step(-1 if player.paused else -60)
+    elif key == pygame.K_UP:
+        player.speed *= 2.0
+    elif key == pygame.K_DOWN:
+        player.speed /= 2.0
+    elif key == pygame.K_r:
+        player.speed = -player.speed
+    elif key == pygame.K_HOME:
+        player.seek(0)
+    elif key == pygame.K_END:
+        player.seek(len(player) - 1)
+
+
+def run_replay(path: str):
+    from replay import TrajectoryPlayer
+
+    pygame.init()
+    screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+
+    simulator = PhysicsSimulator(screen)
+    simulator.settings.trails_enabled = False
+    player = TrajectoryPlayer(path)
+
+    running = True
+    clock = pygame.time.Clock()
+
+    while running:
+        dt = clock.tick(FPS) / 1000.0
+
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.KEYDOWN:
+                handle_replay_key(player, event.key)
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                if event.pos[1] >= WINDOW_HEIGHT - 20:
+                    player.seek(event.pos[0] / WINDOW_WIDTH * (len(player) - 1))
+
+        player.advance(dt)
+        player.load_into(simulator)
 
         screen.fill(BACKGROUND_COLOR)
         simulator.draw()
+        draw_timeline(screen, player)
         pygame.display.flip()
 
-        dpg.render_dearpygui_frame()
+        pygame.display.set_caption(
+            f"Replay {player.index + 1}/{len(player)}  "
+            f"t={simulator.time:.2f}s  speed {player.speed:g}x"
+            + ("  [paused]" if player.paused else "")
+        )
 
-    dpg.destroy_context()
+    player.close()
     pygame.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Interactive particle simulator.")
+    parser.add_argument("--replay", default=None, help="play back a trajectory file")
+    parser.add_argument(
+        "--pipelined",
+        action="store_true",
+        help="step physics on a worker thread while the previous frame is drawn",
+    )
+    parser.add_argument(
+        "--buffers",
+        type=int,
+        choices=(2, 3),
+        default=PIPELINE_BUFFERS,
+        help="particle state buffers in pipelined mode",
+    )
+    args = parser.parse_args()
+
+    if args.replay:
+        run_replay(args.replay)
+    else:
+        run_simulation(args.pipelined, args.buffers)
     sys.exit()
 
 
@@ -0,0 +1,238 @@
+import numpy as np
+from broadphase import EMPTY_PAIRS, expand_ranges
+from config import *
+
+
+class Obstacle:
+    def __init__(self, shape: str, points, radius: float = OBSTACLE_THICKNESS):
+        # SEGMENT is an open polyline, POLYGON a closed one, CIRCLE a single
+        # centre point; every shape is a chain of capsules of this radius.
+        self.shape = shape
+        self.points = np.array(points, dtype=float).reshape(-1, 2)
+        self.radius = radius
+        self.color = OBSTACLE_COLOR
+
+    def capsules(self):
+        points = self.points
+        if self.shape == "CIRCLE":
+            starts = ends = points[:1]
+        elif self.shape == "POLYGON":
+            starts = points
+            ends = np.roll(points, -1, axis=0)
+        elif self.shape == "SEGMENT":
+            starts = points[:-1]
+            ends = points[1:]
+        else:
+            raise ValueError(f"Unknown obstacle shape: {self.shape}")
+        return starts, ends, np.full(len(starts), float(self.radius))
+
+    def bounds(self):
+        low = self.points.min(axis=0) - self.radius
+        high = self.points.max(axis=0) + self.radius
+        return low, high
+
+
+def create_obstacle(shape: str, start, end, thickness: float = OBSTACLE_THICKNESS):
+    # From a mouse drag: a wall from start to end, a box with those corners,
+    # or a circle centred on start reaching end
+    (x0, y0), (x1, y1) = start, end
+    if shape == "SEGMENT":
+        return Obstacle("SEGMENT", [start, end], thickness)
+    if shape == "BOX":
+        return Obstacle("POLYGON", [(x0, y0), (x1, y0), (x1, y1), (x0, y1)], thickness)
+    if shape == "CIRCLE":
+        return Obstacle("CIRCLE", [start], max(float(np.hypot(x1 - x0, y1 - y0)), 1.0))
+    raise ValueError(f"Unknown obstacle shape: {shape}")
+
+
+class ObstacleBVH:
+    def __init__(self, leaf_size: int = OBSTACLE_LEAF_SIZE):
+        self.leaf_size = leaf_size
+        self.starts = np.zeros((0, 2))
+        self.ends = np.zeros((0, 2))
+        self.radii = np.zeros(0)
+        self.node_low = np.zeros((0, 2))
+        self.node_high = np.zeros((0, 2))
+        self.node_start = np.zeros(0, dtype=np.intp)
+        self.node_count = np.zeros(0, dtype=np.intp)
+        self.child_start = np.zeros(0, dtype=np.intp)
+        self.child_count = np.zeros(0, dtype=np.intp)
+
+    def build(self, obstacles):
+        # Built once per change of the obstacle set. Nodes are split at the
+        # median along their longest axis and appended breadth first, so
+        # the two children of a node are neighbours and every node covers a
+        # contiguous run of the reordered capsules.
+        if not obstacles:
+            self.__init__(self.leaf_size)
+            return
+
+        parts = [obstacle.capsules() for obstacle in obstacles]
+        starts = np.concatenate([part[0] for part in parts])
+        ends = np.concatenate([part[1] for part in parts])
+        radii = np.concatenate([part[2] for part in parts])
+        low = np.minimum(starts, ends) - radii[:, None]
+        high = np.maximum(starts, ends) + radii[:, None]
+        centers = (low + high) / 2
+
+        order = np.arange(len(starts))
+        ranges = [(0, len(starts))]
+        child_start = []
+        child_count = []
+        node_low = []
+        node_high = []
+        for start, count in ranges:
+            members = order[start : start + count]
+            node_low.append(low[members].min(axis=0))
+            node_high.append(high[members].max(axis=0))
+            if count <= self.leaf_size:
+                child_start.append(0)
+                child_count.append(0)
+                continue
+            axis = np.argmax(np.ptp(centers[members], axis=0))
+            order[start : start + count] = members[
+                np.argsort(centers[members, axis], kind="stable")
+            ]
+            half = count // 2
+            child_start.append(len(ranges))
+            child_count.append(2)
+            ranges.append((start, half))
+            ranges.append((start + half, count - half))
+
+        self.starts = starts[order]
+        self.ends = ends[order]
+        self.radii = radii[order]
+        self.node_low = np.array(node_low)
+        self.node_high = np.array(node_high)
+        self.node_start = np.array([start for start, _ in ranges], dtype=np.intp)
+        self.node_count = np.array([count for _, count in ranges], dtype=np.intp)
+        self.child_start = np.array(child_start, dtype=np.intp)
+        self.child_count = np.array(child_count, dtype=np.intp)
+
+    def query(self, low, high):
+        # Every (box, capsule) pair whose bounds overlap, walking all boxes
+        # down the tree at once, one level per pass.
+        if len(self.node_start) == 0 or len(low) == 0:
+            return EMPTY_PAIRS
+
+        targets = np.arange(len(low))
+        nodes = np.zeros(len(low), dtype=np.intp)
+        found_targets = []
+        found_capsules = []
+        while len(targets):
+            overlap = np.all(
+                (low[targets] <= self.node_high[nodes])
+                & (high[targets] >= self.node_low[nodes]),
+                axis=1,
+            )
+            targets = targets[overlap]
+            nodes = nodes[overlap]
+
+            leaf = self.child_count[nodes] == 0
+            owner, capsules = expand_ranges(
+                targets[leaf],
+                self.node_start[nodes[leaf]],
+                self.node_count[nodes[leaf]],
+            )
+            found_targets.append(owner)
+            found_capsules.append(capsules)
+
+            targets, nodes = expand_ranges(
+                targets[~leaf],
+                self.child_start[nodes[~leaf]],
+                self.child_count[nodes[~leaf]],
+            )
+
+        return np.concatenate(found_targets), np.concatenate(found_capsules)
+
+
+def projections(tree, points, capsules):
+    # Where each point falls along its capsule's axis, 0 at the start and 1
+    # at the end, unclamped
+    a = tree.starts[capsules]
+    ab = tree.ends[capsules] - a
+    length_sq = np.einsum("ij,ij->i", ab, ab)
+    safe = np.where(length_sq > 0, length_sq, 1.0)
+    return np.einsum("ij,ij->i", points - a, ab) / safe
+
+
+def closest_points(tree, points, capsules, t=None):
+    if t is None:
+        t = projections(tree, points, capsules)
+    a = tree.starts[capsules]
+    ab = tree.ends[capsules] - a
+    return a + ab * np.clip(t, 0.0, 1.0)[:, None]
+
+
+def touching_obstacles(store, tree, n):
+    pos = store.pos[:n]
+    radius = store.radius[:n]
+    i, capsules = tree.query(pos - radius[:, None], pos + radius[:, None])
+    if len(i) == 0:
+        return i, capsules
+    diff = pos[i] - closest_points(tree, pos[i], capsules)
+    reach = radius[i] + tree.radii[capsules]
+    touching = np.einsum("ij,ij->i", diff, diff) < reach * reach
+    return i[touching], capsules[touching]
+
+
+def resolve_obstacle_batch(store, tree, i, capsules, restitution, resting_speed=0.0):
+    pos = store.pos
+    vel = store.vel
+    t = projections(tree, pos[i], capsules)
+    closest = closest_points(tree, pos[i], capsules, t)
+    diff = pos[i] - closest
+    dist = np.hypot(diff[:, 0], diff[:, 1])
+    reach = store.radius[i] + tree.radii[capsules]
+
+    # Facing the side the particle came from, so one that ends a step past
+    # the middle of a thin wall is pushed back rather than through it. Past
+    # either end it can only have gone round the cap, which pushes radially.
+    ab = tree.ends[capsules] - tree.starts[capsules]
+    across = np.stack((-ab[:, 1], ab[:, 0]), axis=1)
+    before = np.einsum("ij,ij->i", store.prev_pos[i] - closest, across)
+    after = np.einsum("ij,ij->i", diff, across)
+    crossed = (before * after < 0) & (t > 0.0) & (t < 1.0)
+
+    safe_dist = np.where(dist > 0, dist, 1.0)
+    normal = diff / safe_dist[:, None]
+    flat = (dist == 0) | crossed
+    if flat.any():
+        length = np.hypot(across[flat, 0], across[flat, 1])
+        side = np.where(before[flat] < 0, -1.0, 1.0)
+        side /= np.where(length > 0, length, 1.0)
+        normal[flat] = across[flat] * side[:, None]
+        # Circles and points have no sides; push them up
+        normal[flat & (np.einsum("ij,ij->i", ab, ab) == 0)] = (0.0, -1.0)
+        dist[flat] = 0.0
+
+    # An earlier round may already have pushed the particle clear
+    hit = flat | (dist < reach)
+    i = i[hit]
+    normal = normal[hit]
+    closing = np.minimum(np.einsum("ij,ij->i", vel[i], normal), 0.0)
+    bounce = np.where(closing < -resting_speed, restitution, 0.0)
+    vel[i] -= normal * ((1 + bounce) * closing)[:, None]
+    pos[i] = closest[hit] + normal * reach[hit, None]
+
+
+def resolve_obstacles(
+    store, tree, restitution: float = RESTITUTION, resting_speed: float = 0.0
+):
+    # A particle can touch several capsules, e.g. both edges at a corner.
+    # Its contacts are resolved in rounds of one per particle, so each round
+    # writes back with plain fancy indexing.
+    i, capsules = touching_obstacles(store, tree, store.active)
+    if len(i) == 0:
+        return i
+
+    order = np.argsort(i, kind="stable")
+    i = i[order]
+    capsules = capsules[order]
+    rank = np.arange(len(i)) - np.searchsorted(i, i)
+    for contact in range(int(rank.max()) + 1):
+        chosen = rank == contact
+        resolve_obstacle_batch(
+            store, tree, i[chosen], capsules[chosen], restitution, resting_speed
+        )
+    return np.unique(i)
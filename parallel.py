@@ -0,0 +1,199 @@
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+from broadphase import EMPTY_PAIRS, SpatialHashBroadPhase
+from kernels import create_kernels
+
+SHARED_FIELDS = ("pos", "radius")
+
+# Worker-side attachments to the store's shared blocks, keyed by block name
+attached = {}
+# Worker-side physics kernels, keyed by backend name
+worker_kernels = {}
+
+
+class SharedArrays:
+    def __init__(self, fields=SHARED_FIELDS):
+        self.fields = fields
+        self.blocks = {}
+        # Blocks replaced by a reallocation stay mapped until the store has
+        # copied every field out of them
+        self.previous = []
+
+    def __call__(self, name, shape, dtype):
+        if name not in self.fields:
+            return np.zeros(shape, dtype=dtype)
+
+        size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        block = shared_memory.SharedMemory(create=True, size=size)
+        array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        array.fill(0)
+
+        previous = self.blocks.get(name)
+        self.blocks[name] = block
+        if previous is not None:
+            self.previous.append(previous)
+        return array
+
+    def release_previous(self):
+        for block in self.previous:
+            self.release(block)
+        self.previous = []
+
+    def describe(self, store):
+        return {
+            name: (self.blocks[name].name, getattr(store, name).shape)
+            for name in self.fields
+        }
+
+    def release(self, block):
+        block.close()
+        block.unlink()
+
+    def close(self):
+        self.release_previous()
+        for block in self.blocks.values():
+            self.release(block)
+        self.blocks = {}
+
+
+def attach(name, shape, dtype):
+    entry = attached.get(name)
+    if entry is None:
+        block = shared_memory.SharedMemory(name=name)
+        entry = attached[name] = (
+            block,
+            np.ndarray(shape, dtype=dtype, buffer=block.buf),
+        )
+    return entry[1]
+
+
+def detach_stale(names):
+    for name in list(attached):
+        if name not in names:
+            block, _ = attached.pop(name)
+            block.close()
+
+
+def strip_kernels(backend: str):
+    kernels = worker_kernels.get(backend)
+    if kernels is None:
+        kernels = worker_kernels[backend] = create_kernels(backend)
+    return kernels
+
+
+def find_strip_pairs(layout, n, x0, x1, cell_size, backend: str):
+    detach_stale({block for block, _ in layout.values()})
+    pos = attach(layout["pos"][0], layout["pos"][1], np.float64)[:n]
+    radius = attach(layout["radius"][0], layout["radius"][1], np.float64)[:n]
+
+    # On the serial path's grid, candidates are at most two cells apart, so
+    # a strip with a two-cell halo sees every candidate the serial search
+    # would report for its own particles.
+    x = pos[:, 0]
+    halo = 2.0 * cell_size
+    local = np.flatnonzero((x >= x0 - halo) & (x < x1 + halo))
+    if len(local) < 2:
+        return EMPTY_PAIRS
+
+    first, second = strip_kernels(backend).find_pairs(
+        SpatialHashBroadPhase(cell_size), pos[local], radius[local], len(local)
+    )
+    i = local[first]
+    j = local[second]
+
+    # The strip holding the left particle of a pair owns it, so pairs seen
+    # by two overlapping halos are reported exactly once.
+    left = np.minimum(x[i], x[j])
+    owned = (left >= x0) & (left < x1)
+    return i[owned], j[owned]
+
+
+class ParallelStepper:
+    def __init__(self, simulator, workers: int):
+        # Each strip is searched with a spatial hash, so other broad phases
+        # have no parallel equivalent
+        if not isinstance(simulator.broad_phase, SpatialHashBroadPhase):
+            raise ValueError(
+                f"Parallel collision detection needs the {SpatialHashBroadPhase.name} "
+                f"broad phase, not {simulator.broad_phase.name}"
+            )
+        self.simulator = simulator
+        self.workers = workers
+        self.shared = SharedArrays()
+        simulator.particles.set_allocator(self.shared)
+        self.pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=get_context("spawn")
+        )
+        self.speedup = None
+
+    def strip_edges(self, x):
+        # Equal-population strips keep the workers balanced on clumped scenes
+        edges = np.quantile(x, np.linspace(0.0, 1.0, self.workers + 1))
+        edges[0] = -np.inf
+        edges[-1] = np.inf
+        return edges
+
+    def find_pairs(self, pos, radius, n):
+        if n < 2:
+            return EMPTY_PAIRS
+
+        simulator = self.simulator
+        layout = self.shared.describe(simulator.particles)
+        # The same grid as the serial search, which also orders the result
+        broad_phase = simulator.broad_phase
+        broad_phase.rebuild(pos, radius, n)
+        edges = self.strip_edges(pos[:n, 0])
+
+        backend = simulator.kernels.name
+        futures = [
+            self.pool.submit(
+                find_strip_pairs,
+                layout,
+                n,
+                edges[k],
+                edges[k + 1],
+                broad_phase.cell_size,
+                backend,
+            )
+            for k in range(self.workers)
+        ]
+        results = [future.result() for future in futures]
+
+        # Candidates come back in the serial order, so contacts are resolved
+        # exactly as they would be without the workers.
+        i = np.concatenate([first for first, _ in results])
+        j = np.concatenate([second for _, second in results])
+        order = broad_phase.pair_order(i, j)
+        return i[order], j[order]
+
+    def measure_speedup(self, repeats: int = 5):
+        # Against the serial path the simulator would run instead
+        simulator = self.simulator
+        store = simulator.particles
+        n = store.active
+
+        def serial(pos, radius, n):
+            return simulator.kernels.find_pairs(simulator.broad_phase, pos, radius, n)
+
+        def timed(find_pairs):
+            start = time.perf_counter()
+            for _ in range(repeats):
+                find_pairs(store.pos, store.radius, n)
+            return (time.perf_counter() - start) / repeats
+
+        serial_time = timed(serial)
+        parallel_time = timed(self.find_pairs)
+        self.speedup = serial_time / parallel_time if parallel_time > 0 else None
+        return {
+            "workers": self.workers,
+            "serial": serial_time,
+            "parallel": parallel_time,
+            "speedup": self.speedup,
+        }
+
+    def close(self):
+        self.pool.shutdown()
+        self.simulator.particles.set_allocator(None)
+        self.shared.close()
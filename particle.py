@@ -1,56 +1,129 @@
-import pygame
-from vector import Vector
-from utils import draw_vector
+from vector import Vector, ArrayVector
 from typing import Union
 from config import *
 import random
 from config import return_colors
-import dearpygui.dearpygui as dpg
+from particle_store import ParticleStore
 
 
 class Particle:
     def __init__(self, pos: Vector, vel: Vector, mass: float, radius: float):
+        self._store = ParticleStore(capacity=1, trail_length=0)
+        self._index = self._store.add_slot()
         self.pos = pos
         self.vel = vel
-        self.acc = Vector(0.0, 0.0)
         self.mass = float(mass)
         self.radius = float(radius)
         self.color = random.choice(return_colors())
-        self.trail = []
-        self.trail_length = return_trail_length()
+
+    @classmethod
+    def view(cls, store, index: int):
+        particle = cls.__new__(cls)
+        particle._store = store
+        particle._index = index
+        return particle
+
+    def _detach(self):
+        store = ParticleStore(capacity=1, trail_length=0)
+        store.copy_slot(self._store, self._index, store.add_slot())
+        self._store = store
+        self._index = 0
+
+    @property
+    def pos(self):
+        return ArrayVector(self._store.pos, self._index)
+
+    @pos.setter
+    def pos(self, value):
+        self._store.pos[self._index] = (value.x, value.y)
+        self._store.prev_pos[self._index] = (value.x, value.y)
+
+    @property
+    def vel(self):
+        return ArrayVector(self._store.vel, self._index)
+
+    @vel.setter
+    def vel(self, value):
+        self._store.vel[self._index] = (value.x, value.y)
+
+    @property
+    def acc(self):
+        return ArrayVector(self._store.acc, self._index)
+
+    @acc.setter
+    def acc(self, value):
+        self._store.acc[self._index] = (value.x, value.y)
+
+    @property
+    def last_acc(self):
+        return ArrayVector(self._store.last_acc, self._index)
+
+    @property
+    def mass(self):
+        return float(self._store.mass[self._index])
+
+    @mass.setter
+    def mass(self, value):
+        store = self._store
+        store.total_mass += float(value) - float(store.mass[self._index])
+        store.mass[self._index] = value
+
+    @property
+    def radius(self):
+        return float(self._store.radius[self._index])
+
+    @radius.setter
+    def radius(self, value):
+        self._store.radius[self._index] = value
+
+    @property
+    def color(self):
+        return tuple(int(c) for c in self._store.color[self._index])
+
+    @color.setter
+    def color(self, value):
+        self._store.color[self._index] = value[:3]
+
+    @property
+    def age(self):
+        return float(self._store.age[self._index])
+
+    @property
+    def lifetime(self):
+        return float(self._store.lifetime[self._index])
+
+    @lifetime.setter
+    def lifetime(self, value):
+        self._store.lifetime[self._index] = value
+
+    @property
+    def trail(self):
+        return [(int(x), int(y)) for x, y in self._store.trail_points(self._index)]
+
+    @property
+    def trail_length(self):
+        return self._store.trail_length
 
     def apply_force(self, force):
-        self.acc += force / self.mass
+        self._store.acc[self._index] += (force.x / self.mass, force.y / self.mass)
 
     def update(self, dt):
-        self.vel += self.acc * dt
-        self.pos += self.vel * dt
-        self.acc = Vector(0, 0)
-        self.trail.append(self.pos.as_tuple())
-        if len(self.trail) > self.trail_length:
-            self.trail.pop(0)
-
-    def draw(self, screen, show_vectors: bool = False):
-        if len(self.trail) > 1:
-            for i in range(len(self.trail) - 1):
-                alpha = int(255 * (i / len(self.trail))) if TRAIL_FADE else 255
-                trail_color = (*self.color[:3], alpha)
-                pygame.draw.line(
-                    screen, trail_color, self.trail[i], self.trail[i + 1], 2
-                )
-
-        pygame.draw.circle(screen, self.color, self.pos.as_tuple(), int(self.radius))
-
-        if show_vectors:
-            try:
-                base_scale = dpg.get_value("vector_scale")
-            except:
-                base_scale = 1.0
-
-            scale_factor = base_scale * max(0.1, self.radius / 20.0)
-
-            if self.vel.magnitude() > 0:
-                draw_vector(screen, self.pos, self.vel, (255, 0, 0), 0.1 * scale_factor)
-
-            if self.acc.magnitude() > 0:
-                draw_vector(screen, self.pos, self.acc, (0, 255, 0), 0.2 * scale_factor)
+        i = self._index
+        store = self._store
+        store.vel[i] += store.acc[i] * dt
+        store.pos[i] += store.vel[i] * dt
+        store.last_acc[i] = store.acc[i]
+        store.acc[i] = 0.0
+
+    def draw(
+        self,
+        screen,
+        show_vectors: bool = False,
+        pos: Vector = None,
+        vector_scale: float = 1.0,
+    ):
+        from renderer import draw_particle
+
+        draw_particle(
+            self, screen, show_vectors, self.pos if pos is None else pos, vector_scale
+        )
@@ -0,0 +1,407 @@
+import numpy as np
+from config import *
+
+
+class ParticleStore:
+    FIELDS = (
+        "pos",
+        "prev_pos",
+        "vel",
+        "acc",
+        "last_acc",
+        "mass",
+        "radius",
+        "color",
+        "trail",
+        "trail_count",
+        "age",
+        "lifetime",
+        "sleep_time",
+        "rest_pos",
+    )
+
+    def __init__(self, capacity: int = 256, trail_length: int = TRAIL_LENGTH):
+        self.count = 0
+        # Awake particles fill [0, active) and sleeping ones [active, count),
+        # so every per-step operation only touches the awake prefix.
+        self.active = 0
+        self.sleep_version = 0
+        self.removed_points = []
+        self.capacity = 0
+        self.trail_length = trail_length
+        self.trail_head = 0
+        self.pos = np.zeros((0, 2))
+        self.prev_pos = np.zeros((0, 2))
+        self.vel = np.zeros((0, 2))
+        self.acc = np.zeros((0, 2))
+        # Acceleration of the last integration, kept for drawing after acc
+        # has been reset for the next step.
+        self.last_acc = np.zeros((0, 2))
+        self.mass = np.zeros(0)
+        self.radius = np.zeros(0)
+        self.color = np.zeros((0, 3), dtype=np.uint8)
+        # Every particle records a point each step, so all trails share one
+        # write head into their fixed-size ring of trail_length points.
+        self.trail = np.zeros((0, trail_length, 2), dtype=np.float32)
+        self.trail_count = np.zeros(0, dtype=np.int32)
+        self.age = np.zeros(0)
+        self.lifetime = np.zeros(0)
+        self.sleep_time = np.zeros(0)
+        # Where each particle was when its sleep_time last started counting
+        self.rest_pos = np.zeros((0, 2))
+        self.views = []
+        self.allocator = None
+        # Kept up to date by every method that adds or removes mass, so the
+        # statistics never have to sum the mass array.
+        self.total_mass = 0.0
+        self.reserve(capacity)
+
+    def reserve(self, capacity: int):
+        if capacity <= self.capacity:
+            return
+        self.reallocate(max(capacity, self.capacity * 2))
+
+    def reallocate(self, capacity: int):
+        for name in self.FIELDS:
+            old = getattr(self, name)
+            shape = (capacity,) + old.shape[1:]
+            if self.allocator is None:
+                new = np.zeros(shape, dtype=old.dtype)
+            else:
+                new = self.allocator(name, shape, old.dtype)
+            new[: self.count] = old[: self.count]
+            setattr(self, name, new)
+        self.capacity = capacity
+        # Only now may the allocator free the memory the old arrays live in
+        if self.allocator is not None:
+            self.allocator.release_previous()
+
+    def set_allocator(self, allocator):
+        self.allocator = allocator
+        self.reallocate(self.capacity)
+
+    def add_slot(self):
+        return self.add_slots(1)
+
+    def add_slots(self, count: int):
+        self.reserve(self.count + count)
+        self.views.extend([None] * count)
+        start = self.active
+        end = self.count + count
+
+        # New particles are awake, so sleepers make room at the end
+        moved = min(count, self.count - self.active)
+        if moved:
+            self.move_slots(
+                np.arange(start, start + moved), np.arange(end - moved, end)
+            )
+            self.views[start : start + moved] = [None] * moved
+            self.sleep_version += 1
+
+        for name in self.FIELDS:
+            getattr(self, name)[start : start + count] = 0
+        self.lifetime[start : start + count] = np.inf
+        self.count += count
+        self.active += count
+        return start
+
+    def move_slots(self, sources, targets):
+        for name in self.FIELDS:
+            array = getattr(self, name)
+            array[targets] = array[sources]
+
+        views = self.views
+        for target, source in zip(targets.tolist(), sources.tolist()):
+            moved = views[source]
+            if moved is not None:
+                moved._index = target
+            views[target] = moved
+
+    def swap_slots(self, first, second):
+        for name in self.FIELDS:
+            array = getattr(self, name)
+            array[first], array[second] = array[second], array[first].copy()
+
+        views = self.views
+        for a, b in zip(first.tolist(), second.tolist()):
+            views[a], views[b] = views[b], views[a]
+            if views[a] is not None:
+                views[a]._index = a
+            if views[b] is not None:
+                views[b]._index = b
+
+    def spawn(self, pos, vel, mass, radius, color, lifetime=np.inf):
+        count = len(pos)
+        start = self.add_slots(count)
+        end = start + count
+        self.pos[start:end] = pos
+        self.prev_pos[start:end] = pos
+        self.rest_pos[start:end] = pos
+        self.vel[start:end] = vel
+        self.mass[start:end] = mass
+        self.radius[start:end] = radius
+        self.color[start:end] = color
+        self.lifetime[start:end] = lifetime
+        self.total_mass += float(self.mass[start:end].sum())
+        return start
+
+    def add(self, particle):
+        if particle._store is self:
+            return particle._index
+
+        i = self.add_slot()
+        self.copy_slot(particle._store, particle._index, i)
+        self.trail_count[i] = 0
+        self.views[i] = particle
+        self.total_mass += float(self.mass[i])
+
+        particle._store = self
+        particle._index = i
+        return i
+
+    def copy_slot(self, source, j: int, i: int):
+        for name in self.FIELDS:
+            if name == "trail" and source.trail_length != self.trail_length:
+                continue
+            getattr(self, name)[i] = getattr(source, name)[j]
+
+    def copy_from(self, source, fields=FIELDS):
+        # Mirror the live slots of another store, e.g. for drawing on
+        # another thread; views are not carried over.
+        n = source.count
+        self.reserve(n)
+        for name in fields:
+            getattr(self, name)[:n] = getattr(source, name)[:n]
+        self.count = n
+        self.active = source.active
+        self.trail_head = source.trail_head
+        self.total_mass = source.total_mass
+
+    def remove(self, particle):
+        if particle._store is not self:
+            return
+        self.remove_index(particle._index)
+
+    def remove_index(self, i: int):
+        self.remove_indices(np.array([i]))
+
+    def fill_holes(self, holes, end: int):
+        # Refill the holes below end from the last survivors before end,
+        # leaving [end - len(holes), end) free.
+        keep = np.ones(end, dtype=bool)
+        keep[holes] = False
+        new_end = end - len(holes)
+        sources = np.flatnonzero(keep[new_end:]) + new_end
+        holes = holes[holes < new_end]
+        if len(holes):
+            self.move_slots(sources, holes)
+
+    def remove_indices(self, indices):
+        # Removed slots are refilled from the tail, and the tail beyond count
+        # is the free pool that spawn() and add() reuse without reallocating.
+        indices = np.unique(indices)
+        if len(indices) == 0:
+            return 0
+
+        for i in indices.tolist():
+            removed = self.views[i]
+            if removed is not None:
+                removed._detach()
+
+        self.total_mass -= float(self.mass[indices].sum())
+        if self.active < self.count:
+            # Sleepers resting on these particles have to notice they left
+            self.removed_points.append(
+                (self.pos[indices].copy(), self.radius[indices].copy())
+            )
+            self.sleep_version += 1
+
+        sleeping = indices[indices >= self.active]
+        self.fill_holes(sleeping, self.count)
+        self.count -= len(sleeping)
+
+        awake = indices[indices < self.active]
+        if len(awake):
+            self.fill_holes(awake, self.active)
+            gap = self.active - len(awake)
+            moved = min(len(awake), self.count - self.active)
+            if moved:
+                self.move_slots(
+                    np.arange(self.count - moved, self.count),
+                    np.arange(gap, gap + moved),
+                )
+            self.active -= len(awake)
+            self.count -= len(awake)
+
+        del self.views[self.count :]
+        return len(indices)
+
+    def partition(self, indices, start: int, end: int):
+        # Swap the given slots into [start, end) without disturbing the rest
+        block = np.zeros(self.count, dtype=bool)
+        block[start:end] = True
+        chosen = np.zeros(self.count, dtype=bool)
+        chosen[indices] = True
+        incoming = np.flatnonzero(chosen & ~block)
+        outgoing = np.flatnonzero(block & ~chosen)
+        if len(incoming):
+            self.swap_slots(incoming, outgoing)
+
+    def sleep(self, indices):
+        indices = np.unique(indices)
+        if len(indices) == 0:
+            return 0
+        start = self.active - len(indices)
+        self.partition(indices, start, self.active)
+        self.active = start
+
+        asleep = slice(start, start + len(indices))
+        self.vel[asleep] = 0.0
+        self.acc[asleep] = 0.0
+        self.last_acc[asleep] = 0.0
+        self.prev_pos[asleep] = self.pos[asleep]
+        self.trail_count[asleep] = 0
+        self.sleep_version += 1
+        return len(indices)
+
+    def wake(self, indices):
+        indices = np.unique(indices)
+        if len(indices) == 0:
+            return 0
+        end = self.active + len(indices)
+        self.partition(indices, self.active, end)
+        self.sleep_time[self.active : end] = 0.0
+        self.rest_pos[self.active : end] = self.pos[self.active : end]
+        self.active = end
+        self.sleep_version += 1
+        return len(indices)
+
+    def wake_all(self):
+        if self.active == self.count:
+            return 0
+        woken = self.count - self.active
+        self.sleep_time[self.active : self.count] = 0.0
+        self.rest_pos[self.active : self.count] = self.pos[self.active : self.count]
+        self.active = self.count
+        self.sleep_version += 1
+        return woken
+
+    def expire(self, dt: float):
+        n = self.count
+        self.age[:n] += dt
+        expired = np.flatnonzero(self.age[:n] >= self.lifetime[:n])
+        if len(expired) == 0:
+            return 0
+        return self.remove_indices(expired)
+
+    def clear(self):
+        for particle in self.views:
+            if particle is not None:
+                particle._detach()
+        self.views = []
+        self.count = 0
+        self.active = 0
+        self.sleep_version += 1
+        self.removed_points = []
+        self.trail_head = 0
+        self.total_mass = 0.0
+
+    def recount_mass(self):
+        # For callers that write the mass array directly
+        self.total_mass = float(self.mass[: self.count].sum())
+
+    def save_previous(self):
+        self.prev_pos[: self.active] = self.pos[: self.active]
+
+    def interpolated_positions(self, alpha: float):
+        n = self.count
+        if alpha >= 1.0:
+            return self.pos[:n]
+        return self.prev_pos[:n] + (self.pos[:n] - self.prev_pos[:n]) * alpha
+
+    def integrate(self, dt: float):
+        n = self.active
+        self.vel[:n] += self.acc[:n] * dt
+        self.pos[:n] += self.vel[:n] * dt
+        self.last_acc[:n] = self.acc[:n]
+        self.acc[:n] = 0.0
+
+    def record_trails(self):
+        n = self.active
+        if self.trail_length == 0:
+            return
+        self.trail[:n, self.trail_head] = self.pos[:n]
+        self.trail_head = (self.trail_head + 1) % self.trail_length
+        np.minimum(
+            self.trail_count[:n] + 1, self.trail_length, out=self.trail_count[:n]
+        )
+
+    def trail_order(self):
+        # Ring slots from oldest to newest point
+        return (self.trail_head + np.arange(self.trail_length)) % self.trail_length
+
+    def trail_points(self, i: int):
+        count = int(self.trail_count[i])
+        if count == 0:
+            return self.trail[i, :0]
+        return self.trail[i, self.trail_order()[-count:]]
+
+    def apply_gravity(self, gravity: float):
+        # F = m * g, so the acceleration is g for every particle
+        self.acc[: self.active, 1] += gravity
+
+    def handle_boundaries(
+        self,
+        width: float,
+        height: float,
+        restitution: float,
+        resting_speed: float = 0.0,
+    ):
+        n = self.active
+        x = self.pos[:n, 0]
+        y = self.pos[:n, 1]
+        vx = self.vel[:n, 0]
+        vy = self.vel[:n, 1]
+        r = self.radius[:n]
+
+        # Hits slower than resting_speed do not bounce, so particles can come
+        # to rest on the walls
+        def reflect(v, hit):
+            v[hit] *= np.where(np.abs(v[hit]) > resting_speed, -restitution, 0.0)
+
+        hit = y + r > height
+        y[hit] = height - r[hit]
+        reflect(vy, hit)
+
+        hit = y - r < 0
+        y[hit] = r[hit]
+        reflect(vy, hit)
+
+        hit = x + r > width
+        x[hit] = width - r[hit]
+        reflect(vx, hit)
+
+        hit = x - r < 0
+        x[hit] = r[hit]
+        reflect(vx, hit)
+
+    def view(self, i: int):
+        particle = self.views[i]
+        if particle is None:
+            from particle import Particle
+
+            particle = Particle.view(self, i)
+            self.views[i] = particle
+        return particle
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter([self.view(i) for i in range(self.count)])
+
+    def __getitem__(self, i):
+        return self.view(range(self.count)[i])
+
+    def __contains__(self, particle):
+        return getattr(particle, "_store", None) is self
@@ -0,0 +1,156 @@
+import copy
+import queue
+import threading
+import time
+from particle_store import ParticleStore
+from settings import use_heatmap
+from config import *
+
+DRAWN_FIELDS = ("pos", "prev_pos", "radius", "color")
+VECTOR_FIELDS = ("vel", "last_acc")
+TRAIL_FIELDS = ("trail", "trail_count")
+
+
+class Frame:
+    # Everything Simulator.draw and GUI.update_stats read, copied out of the
+    # simulator so the main thread can draw it while the next frame is stepped.
+    def __init__(self, profiler):
+        self.particles = ParticleStore()
+        self.alpha = 1.0
+        self.time = 0.0
+        self.settings = None
+        self.force_fields = []
+        self.emitters = []
+        self.obstacles = []
+        self.statistics = None
+        self.last_substeps = 0
+        self.dropped_time = 0.0
+        self.profiler = profiler
+
+    def capture(self, simulator):
+        settings = copy.copy(simulator.settings)
+        fields = DRAWN_FIELDS
+        if use_heatmap(settings, simulator.particles.count):
+            if settings.heatmap_color == "speed":
+                fields += ("vel",)
+        else:
+            if settings.show_vectors:
+                fields += VECTOR_FIELDS
+            if settings.trails_enabled:
+                fields += TRAIL_FIELDS
+
+        source = simulator.particles
+        if self.particles.trail_length != source.trail_length:
+            self.particles = ParticleStore(trail_length=source.trail_length)
+        self.particles.copy_from(source, fields)
+
+        self.alpha = simulator.alpha
+        self.time = simulator.time
+        self.settings = settings
+        self.force_fields = list(simulator.force_fields)
+        self.emitters = list(simulator.emitters)
+        self.obstacles = list(simulator.obstacles)
+        if (
+            self.statistics is None
+            or self.statistics.version != simulator.statistics.version
+        ):
+            self.statistics = copy.copy(simulator.statistics)
+        self.last_substeps = simulator.last_substeps
+        self.dropped_time = simulator.dropped_time
+
+
+class Pipeline:
+    def __init__(self, simulator, buffers: int = PIPELINE_BUFFERS, fps: float = FPS):
+        if buffers < 2:
+            raise ValueError("The pipeline needs at least two buffers")
+        self.simulator = simulator
+        self.frame_time = 1.0 / fps
+        # With two buffers the worker waits for the renderer to let go of a
+        # frame; with three it keeps stepping and unseen frames are reused.
+        self.free = queue.Queue()
+        for _ in range(buffers):
+            self.free.put(Frame(simulator.profiler))
+        self.lock = threading.Lock()
+        self.latest = None
+        self.front = None
+        self.commands = queue.SimpleQueue()
+        self.running = False
+        self.error = None
+        self.worker = None
+
+    def submit(self, command, *args):
+        # GUI edits run on the worker between two advance() calls
+        self.commands.put((command, args))
+
+    def apply_commands(self):
+        while True:
+            try:
+                command, args = self.commands.get_nowait()
+            except queue.Empty:
+                return
+            command(*args)
+
+    def start(self):
+        self.running = True
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+
+    def stop(self):
+        self.running = False
+        if self.worker is not None:
+            self.worker.join()
+            self.worker = None
+        # Commands queued after the last frame still count
+        self.apply_commands()
+
+    def run(self):
+        try:
+            self.step_loop()
+        except BaseException as error:
+            self.error = error
+            self.running = False
+
+    def step_loop(self):
+        simulator = self.simulator
+        last = time.perf_counter()
+        while self.running:
+            try:
+                frame = self.free.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            now = time.perf_counter()
+            dt = now - last
+            last = now
+
+            self.apply_commands()
+            simulator.advance(dt)
+            frame.capture(simulator)
+            simulator.profiler.end_frame()
+            self.publish(frame)
+
+            remaining = last + self.frame_time - time.perf_counter()
+            if remaining > 0:
+                time.sleep(remaining)
+
+    def publish(self, frame):
+        with self.lock:
+            previous = self.latest
+            self.latest = frame
+        if previous is not None:
+            self.free.put(previous)
+
+    def acquire(self):
+        # Newest frame finished since the last call, or None; the frame
+        # drawn before goes back to the worker.
+        if self.error is not None:
+            raise self.error
+        with self.lock:
+            frame = self.latest
+            self.latest = None
+        if frame is None:
+            return None
+        if self.front is not None:
+            self.free.put(self.front)
+        self.front = frame
+        return frame
@@ -0,0 +1,166 @@
+import csv
+import json
+import threading
+import time
+from collections import deque
+import numpy as np
+from config import *
+
+
+class NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_PHASE = NullPhase()
+
+PHASES = (
+    "lifetimes",
+    "emitters",
+    "sleep",
+    "gravity",
+    "mutual_gravity",
+    "fields",
+    "integration",
+    "trails",
+    "boundaries",
+    "obstacles",
+    "collisions",
+    "statistics",
+    "recording",
+    "rendering",
+    "total",
+)
+
+
+class Phase:
+    def __init__(self, profiler, name: str):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        frame = self.profiler.thread_state().frame
+        frame[self.name] = frame.get(self.name, 0.0) + elapsed
+        return False
+
+
+class Profiler:
+    def __init__(
+        self,
+        enabled: bool = PROFILER_ENABLED,
+        window: int = PROFILER_WINDOW,
+        trace_limit: int = PROFILER_TRACE_LIMIT,
+    ):
+        self.enabled = enabled
+        self.window = window
+        self.trace_limit = trace_limit
+        self.samples = {}
+        self.trace = deque(maxlen=trace_limit)
+        self.frame_index = 0
+        self.resets = 0
+        # Pipelined, physics phases run on a worker thread while the main
+        # thread draws, so each thread times into its own frame
+        self.local = threading.local()
+        # The pipelined main loop reads summaries while a worker thread
+        # ends frames
+        self.lock = threading.Lock()
+
+    def thread_state(self):
+        state = self.local
+        if getattr(state, "resets", None) != self.resets:
+            state.resets = self.resets
+            state.frame = {}
+            state.phases = {}
+        return state
+
+    def phase(self, name: str):
+        if not self.enabled:
+            return NULL_PHASE
+        phases = self.thread_state().phases
+        phase = phases.get(name)
+        if phase is None:
+            phase = phases[name] = Phase(self, name)
+        return phase
+
+    def end_frame(self, trace: bool = True):
+        # Records the phases timed on the calling thread; a thread that only
+        # draws a pipelined frame passes trace=False so its phases are sampled
+        # without opening a frame of their own
+        if not self.enabled:
+            return
+
+        state = self.thread_state()
+        frame = state.frame
+        state.frame = {}
+        if trace:
+            frame["total"] = sum(frame.values())
+
+        with self.lock:
+            for name, seconds in frame.items():
+                samples = self.samples.get(name)
+                if samples is None:
+                    samples = self.samples[name] = deque(maxlen=self.window)
+                samples.append(seconds)
+
+            if trace:
+                self.trace.append((self.frame_index, frame))
+                self.frame_index += 1
+
+    def summary(self):
+        with self.lock:
+            copies = {name: list(samples) for name, samples in self.samples.items()}
+
+        result = {}
+        for name, samples in copies.items():
+            values = np.array(samples, dtype=float)
+            p50, p95, p99 = np.percentile(values, (50, 95, 99))
+            result[name] = {
+                "mean": float(values.mean()),
+                "p50": float(p50),
+                "p95": float(p95),
+                "p99": float(p99),
+                "max": float(values.max()),
+            }
+        return result
+
+    def reset(self):
+        with self.lock:
+            # Every thread drops its open frame the next time it times a phase
+            self.resets += 1
+            self.samples = {}
+            self.trace.clear()
+            self.frame_index = 0
+
+    def export(self, path: str):
+        with self.lock:
+            trace = list(self.trace)
+
+        if path.endswith(".json"):
+            with open(path, "w") as f:
+                json.dump(
+                    {
+                        "summary": self.summary(),
+                        "frames": [
+                            {"frame": index, **phases} for index, phases in trace
+                        ],
+                    },
+                    f,
+                    indent=2,
+                )
+            return
+
+        names = sorted({name for _, phases in trace for name in phases})
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["frame"] + names)
+            for index, phases in trace:
+                writer.writerow([index] + [phases.get(name, 0.0) for name in names])
@@ -0,0 +1,135 @@
+import os
+import queue
+import struct
+import threading
+import numpy as np
+
+MAGIC = b"PSTRAJ01"
+HEADER = struct.Struct("<8sIIQd")
+HEADER_SIZE = 64
+
+
+def record_dtype(max_particles: int):
+    return np.dtype(
+        [
+            ("frame", "<u8"),
+            ("time", "<f8"),
+            ("count", "<u4"),
+            ("pos", "<f4", (max_particles, 2)),
+            ("vel", "<f4", (max_particles, 2)),
+            ("radius", "<f4", (max_particles,)),
+            ("color", "u1", (max_particles, 3)),
+        ]
+    )
+
+
+def read_header(f):
+    magic, version, max_particles, record_size, dt = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError("Not a trajectory file")
+    return max_particles, record_size, dt
+
+
+class TrajectoryRecorder:
+    def __init__(
+        self, path: str, max_particles: int, dt: float = 0.0, buffers: int = 8
+    ):
+        self.path = path
+        self.max_particles = max_particles
+        self.dtype = record_dtype(max_particles)
+        self.frame = 0
+        self.truncated_frames = 0
+        self.stalls = 0
+
+        self.file = open(path, "wb")
+        header = HEADER.pack(MAGIC, 1, max_particles, self.dtype.itemsize, dt)
+        self.file.write(header.ljust(HEADER_SIZE, b"\0"))
+
+        # Records cycle between the step loop and the writer thread, so
+        # recording allocates nothing after start-up.
+        self.free = queue.Queue()
+        for _ in range(buffers):
+            self.free.put(np.zeros(1, dtype=self.dtype))
+        self.pending = queue.Queue()
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer.start()
+
+    def record(self, simulator):
+        try:
+            record = self.free.get_nowait()
+        except queue.Empty:
+            self.stalls += 1
+            record = self.free.get()
+
+        store = simulator.particles
+        n = min(len(store), self.max_particles)
+        if n < len(store):
+            self.truncated_frames += 1
+
+        entry = record[0]
+        entry["frame"] = self.frame
+        entry["time"] = simulator.time
+        entry["count"] = n
+        entry["pos"][:n] = store.pos[:n]
+        entry["vel"][:n] = store.vel[:n]
+        entry["radius"][:n] = store.radius[:n]
+        entry["color"][:n] = store.color[:n]
+        self.pending.put(record)
+        self.frame += 1
+
+    def write_loop(self):
+        while True:
+            record = self.pending.get()
+            if record is None:
+                break
+            record.tofile(self.file)
+            self.free.put(record)
+
+    def close(self):
+        self.pending.put(None)
+        self.writer.join()
+        self.file.close()
+
+
+class TrajectoryReader:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.max_particles, record_size, self.dt = read_header(f)
+        self.dtype = record_dtype(self.max_particles)
+        if self.dtype.itemsize != record_size:
+            raise ValueError("Trajectory record layout does not match its header")
+        self.records = np.zeros(0, dtype=self.dtype)
+        self.refresh()
+
+    def refresh(self):
+        # A file still being recorded may end in a partially written record
+        size = os.path.getsize(self.path) - HEADER_SIZE
+        frames = max(size, 0) // self.dtype.itemsize
+        if frames and frames != len(self.records):
+            self.records = np.memmap(
+                self.path,
+                dtype=self.dtype,
+                mode="r",
+                offset=HEADER_SIZE,
+                shape=(frames,),
+            )
+        return len(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index: int):
+        return self.records[index]
+
+    def frame(self, index: int):
+        record = self.records[index]
+        n = int(record["count"])
+        return {
+            "frame": int(record["frame"]),
+            "time": float(record["time"]),
+            "pos": record["pos"][:n],
+            "vel": record["vel"][:n],
+            "radius": record["radius"][:n],
+            "color": record["color"][:n],
+        }
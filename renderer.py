@@ -0,0 +1,367 @@
+import pygame
+from utils import draw_vector, ARROW_LEFT, ARROW_RIGHT
+from config import *
+import numpy as np
+import math
+
+SPRITE_COLORKEY = (1, 1, 1)
+EMITTER_CONE_RADIUS = 15
+ARROW_SIZE = 8
+VELOCITY_COLOR = (255, 0, 0)
+ACCELERATION_COLOR = (0, 255, 0)
+
+
+def rotation_matrix(rot):
+    # Transposed, so row vectors can be rotated with a right multiplication
+    return np.array([[rot.cos, rot.sin], [-rot.sin, rot.cos]])
+
+
+ARROW_HEADS = (rotation_matrix(ARROW_LEFT), rotation_matrix(ARROW_RIGHT))
+
+
+def arrow_geometry(starts, vectors, scales):
+    magnitude = np.hypot(vectors[:, 0], vectors[:, 1])
+    moving = magnitude > 0
+    starts = starts[moving]
+    vectors = vectors[moving]
+
+    ends = starts + vectors * scales[moving, None]
+    direction = vectors * (ARROW_SIZE / magnitude[moving])[:, None]
+    left = ends + direction @ ARROW_HEADS[0]
+    right = ends + direction @ ARROW_HEADS[1]
+    return (
+        starts.astype(np.int64),
+        ends.astype(np.int64),
+        left.astype(np.int64),
+        right.astype(np.int64),
+    )
+
+
+def heatmap_palette(stops=HEATMAP_STOPS, size: int = 256):
+    stops = np.array(stops, dtype=float)
+    x = np.linspace(0, len(stops) - 1, size)
+    knots = np.arange(len(stops))
+    channels = [np.interp(x, knots, stops[:, c]) for c in range(3)]
+    return np.stack(channels, axis=1).astype(np.uint8)
+
+
+def particle_sprite(radius: int, color):
+    size = max(1, 2 * radius)
+    sprite = pygame.Surface((size, size))
+    sprite.fill(SPRITE_COLORKEY)
+    sprite.set_colorkey(SPRITE_COLORKEY)
+    pygame.draw.circle(sprite, color, (radius, radius), radius)
+    return sprite
+
+
+def obstacle_surface(size, obstacles):
+    surface = pygame.Surface(size, pygame.SRCALPHA)
+    for obstacle in obstacles:
+        starts, ends, radii = obstacle.capsules()
+        for start, end, radius in zip(starts.tolist(), ends.tolist(), radii.tolist()):
+            if start == end:
+                pygame.draw.circle(surface, obstacle.color, start, max(1, radius))
+                continue
+            width = max(1, int(2 * radius))
+            pygame.draw.line(surface, obstacle.color, start, end, width)
+            if radius > 1:
+                pygame.draw.circle(surface, obstacle.color, start, radius)
+                pygame.draw.circle(surface, obstacle.color, end, radius)
+    return surface
+
+
+def force_field_sprite(radius: float, color):
+    size = int(radius * 2)
+    sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+    pygame.draw.circle(sprite, color, (radius, radius), radius)
+    pygame.draw.circle(sprite, (255, 255, 255), (int(radius), int(radius)), 5)
+    return sprite
+
+
+def emitter_cone(angle_range, center, radius=EMITTER_CONE_RADIUS):
+    points = [center]
+    for angle in range(int(angle_range[0]), int(angle_range[1]) + 1, 10):
+        rad = math.radians(angle)
+        x = center[0] + radius * math.cos(rad)
+        y = center[1] + radius * math.sin(rad)
+        points.append((int(x), int(y)))
+    return points
+
+
+def emitter_sprite(angle_range):
+    half = EMITTER_CONE_RADIUS + 1
+    sprite = pygame.Surface((2 * half, 2 * half), pygame.SRCALPHA)
+    center = (half, half)
+    pygame.draw.circle(sprite, (200, 200, 200), center, 10)
+    pygame.draw.circle(sprite, (100, 100, 100), center, 8)
+
+    if abs(angle_range[1] - angle_range[0]) < 360:
+        points = emitter_cone(angle_range, center)
+        if len(points) > 2:
+            pygame.draw.polygon(sprite, (150, 150, 150), points, 1)
+    return sprite
+
+
+class Renderer:
+    def __init__(self):
+        self.trail_surface = None
+        # Ring position the trail layer was last drawn up to
+        self.trail_head = None
+        self.particle_sprites = {}
+        self.overlay_cache = {}
+        # Obstacles never move, so they are drawn once per obstacle set
+        self.obstacle_layer = None
+        self.drawn_obstacles = None
+        self.palette = heatmap_palette()
+        self.heatmap_grid = None
+        self.heatmap_scaled = None
+
+    def overlay(self, screen, clear: bool = True):
+        size = screen.get_size()
+        if self.trail_surface is None or self.trail_surface.get_size() != size:
+            self.trail_surface = pygame.Surface(size, pygame.SRCALPHA)
+            self.trail_head = None
+            clear = True
+        if clear:
+            self.trail_surface.fill((0, 0, 0, 0))
+        return self.trail_surface
+
+    def reset_trails(self):
+        if self.trail_head is not None:
+            self.trail_head = None
+            self.trail_surface.fill((0, 0, 0, 0))
+
+    def cached_overlay(self, owner, params, build):
+        entry = self.overlay_cache.get(id(owner))
+        if entry is None or entry[0] is not owner or entry[1] != params:
+            entry = self.overlay_cache[id(owner)] = (owner, params, build())
+        return entry[2]
+
+    def prune_overlays(self, owners):
+        live = {id(owner) for owner in owners}
+        for key in list(self.overlay_cache):
+            if key not in live:
+                del self.overlay_cache[key]
+
+    def draw_overlays(self, screen, force_fields, emitters):
+        self.prune_overlays(force_fields + emitters)
+        blits = []
+
+        for field in force_fields:
+            if not field.active:
+                continue
+            sprite = self.cached_overlay(
+                field,
+                (field.radius, field.color),
+                lambda: force_field_sprite(field.radius, field.color),
+            )
+            blits.append(
+                (sprite, (field.pos.x - field.radius, field.pos.y - field.radius))
+            )
+
+        for emitter in emitters:
+            if not emitter.active:
+                continue
+            angle_range = tuple(emitter.angle_range)
+            sprite = self.cached_overlay(
+                emitter, angle_range, lambda: emitter_sprite(angle_range)
+            )
+            x, y = emitter.pos.as_tuple()
+            half = sprite.get_width() // 2
+            blits.append((sprite, (x - half, y - half)))
+
+        if blits:
+            screen.blits(blits, doreturn=False)
+
+    def draw_obstacles(self, screen, obstacles):
+        if not obstacles:
+            return
+        size = screen.get_size()
+        if self.drawn_obstacles != obstacles or self.obstacle_layer.get_size() != size:
+            self.obstacle_layer = obstacle_surface(size, obstacles)
+            self.drawn_obstacles = list(obstacles)
+        screen.blit(self.obstacle_layer, (0, 0))
+
+    def draw_particles(self, screen, store, positions):
+        n = store.count
+        if n == 0:
+            return
+
+        radii = np.maximum(store.radius[:n].astype(np.int64), 1)
+        colors = store.color[:n].astype(np.int64)
+        keys = (radii << 24) | (colors[:, 0] << 16) | (colors[:, 1] << 8) | colors[:, 2]
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+
+        sprites = []
+        for key in unique_keys.tolist():
+            sprite = self.particle_sprites.get(key)
+            if sprite is None:
+                radius = key >> 24
+                color = ((key >> 16) & 255, (key >> 8) & 255, key & 255)
+                sprite = self.particle_sprites[key] = particle_sprite(radius, color)
+            sprites.append(sprite)
+
+        corners = (positions[:n].astype(np.int64) - radii[:, None]).tolist()
+        screen.blits(
+            [(sprites[k], corner) for k, corner in zip(inverse.tolist(), corners)],
+            doreturn=False,
+        )
+
+    def heatmap_surfaces(self, screen, cell: int):
+        width, height = screen.get_size()
+        size = (-(-width // cell), -(-height // cell))
+        if self.heatmap_grid is None or self.heatmap_grid.get_size() != size:
+            self.heatmap_grid = pygame.Surface(size)
+            self.heatmap_scaled = pygame.Surface((size[0] * cell, size[1] * cell))
+        return self.heatmap_grid, self.heatmap_scaled
+
+    def draw_heatmap(
+        self, screen, store, positions, color_by: str, cell: int = HEATMAP_CELL
+    ):
+        # Bin every particle into a coarse grid and write the whole grid in
+        # one surfarray call, so the cost barely grows with the count.
+        cell = max(1, int(cell))
+        grid, scaled = self.heatmap_surfaces(screen, cell)
+        columns, rows = grid.get_size()
+        n = store.count
+
+        cells = np.floor(positions[:n] / cell).astype(np.int64)
+        inside = (
+            (cells[:, 0] >= 0)
+            & (cells[:, 0] < columns)
+            & (cells[:, 1] >= 0)
+            & (cells[:, 1] < rows)
+        )
+        keys = cells[inside, 0] * rows + cells[inside, 1]
+        counts = np.bincount(keys, minlength=columns * rows)
+
+        if color_by == "speed":
+            vel = store.vel[:n][inside]
+            speed = np.hypot(vel[:, 0], vel[:, 1])
+            level = np.bincount(keys, weights=speed, minlength=columns * rows)
+            level /= np.maximum(counts, 1)
+        else:
+            # Log scale, so sparse regions stay visible next to dense piles
+            level = np.log1p(counts)
+
+        top = level.max() if len(level) else 0.0
+        if top > 0:
+            index = (level * (255.0 / top)).astype(np.intp)
+        else:
+            index = np.zeros(len(level), dtype=np.intp)
+        pixels = self.palette[index]
+        pixels[counts == 0] = BACKGROUND_COLOR
+
+        pygame.surfarray.blit_array(grid, pixels.reshape(columns, rows, 3))
+        if cell == 1:
+            screen.blit(grid, (0, 0))
+        else:
+            pygame.transform.scale(grid, scaled.get_size(), scaled)
+            screen.blit(scaled, (0, 0))
+
+    def draw_vectors(self, screen, store, positions, scale: float, limit: int = 0):
+        n = store.count
+        if n == 0:
+            return
+
+        # Above the limit only every stride-th particle gets arrows
+        stride = 1 if limit <= 0 else -(-n // limit)
+        chosen = slice(0, n, stride)
+        starts = positions[:n][chosen]
+        scales = scale * np.maximum(0.1, store.radius[:n][chosen] / 20.0)
+
+        line = pygame.draw.line
+        polygon = pygame.draw.polygon
+        for vectors, color, factor in (
+            (store.vel[:n][chosen], VELOCITY_COLOR, 0.1),
+            (store.last_acc[:n][chosen], ACCELERATION_COLOR, 0.2),
+        ):
+            geometry = arrow_geometry(starts, vectors, scales * factor)
+            color = (*color, 200)
+            for start, end, left, right in zip(*(part.tolist() for part in geometry)):
+                line(screen, color, start, end, 2)
+                polygon(screen, color, (end, left, right))
+
+    def draw_trails(self, screen, store):
+        n = store.count
+        if store.trail_length < 2:
+            return
+        if not TRAIL_FADE:
+            self.draw_full_trails(screen, store)
+            return
+
+        # The layer keeps what earlier frames drew and fades it a little each
+        # frame, so only the points recorded since then are drawn.
+        fresh = self.trail_head is None
+        surface = self.overlay(screen, clear=fresh)
+        length = store.trail_length
+        if fresh:
+            steps = length - 1
+        else:
+            steps = (store.trail_head - self.trail_head) % length
+        self.trail_head = store.trail_head
+
+        if steps and n:
+            fade = min(255, -(-255 * steps // length))
+            surface.fill((0, 0, 0, fade), special_flags=pygame.BLEND_RGBA_SUB)
+
+            recent = min(steps + 1, length)
+            counts = np.minimum(store.trail_count[:n], recent)
+            chosen = np.flatnonzero(counts >= 2)
+            slots = store.trail_order()[-recent:]
+            points = store.trail[chosen[:, None], slots].astype(np.int32).tolist()
+            colors = store.color[chosen].tolist()
+            lines = pygame.draw.lines
+            for trail, count, color in zip(points, counts[chosen].tolist(), colors):
+                lines(surface, (*color, 255), False, trail[-count:], 2)
+
+        screen.blit(surface, (0, 0))
+
+    def draw_full_trails(self, screen, store):
+        n = store.count
+        surface = self.overlay(screen)
+        counts = store.trail_count[:n]
+        chosen = np.flatnonzero(counts >= 2)
+        points = store.trail[chosen][:, store.trail_order()].astype(np.int32).tolist()
+        colors = store.color[chosen].tolist()
+        lines = pygame.draw.lines
+        for trail, count, color in zip(points, counts[chosen].tolist(), colors):
+            lines(surface, (*color, 255), False, trail[-count:], 2)
+        screen.blit(surface, (0, 0))
+
+
+def draw_particle(particle, screen, show_vectors: bool, pos, vector_scale: float = 1.0):
+    pygame.draw.circle(screen, particle.color, pos.as_tuple(), int(particle.radius))
+
+    if show_vectors:
+        draw_particle_vectors(particle, screen, pos, vector_scale)
+
+
+def draw_particle_vectors(particle, screen, pos, vector_scale: float = 1.0):
+    scale_factor = vector_scale * max(0.1, particle.radius / 20.0)
+
+    vel = particle.vel
+    if vel.magnitude() > 0:
+        draw_vector(screen, pos, vel, VELOCITY_COLOR, 0.1 * scale_factor)
+
+    acc = particle.last_acc
+    if acc.magnitude() > 0:
+        draw_vector(screen, pos, acc, ACCELERATION_COLOR, 0.2 * scale_factor)
+
+
+def draw_force_field(field, screen):
+    if not field.active:
+        return
+
+    sprite = force_field_sprite(field.radius, field.color)
+    screen.blit(sprite, (field.pos.x - field.radius, field.pos.y - field.radius))
+
+
+def draw_emitter(emitter, screen):
+    if not emitter.active:
+        return
+
+    sprite = emitter_sprite(emitter.angle_range)
+    x, y = emitter.pos.as_tuple()
+    half = sprite.get_width() // 2
+    screen.blit(sprite, (x - half, y - half))
@@ -0,0 +1,128 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from recording import TrajectoryReader
+from config import *
+
+
+class FrameCache:
+    def __init__(self, reader: TrajectoryReader, capacity: int = REPLAY_CACHE_FRAMES):
+        self.reader = reader
+        self.capacity = capacity
+        self.frames = OrderedDict()
+        self.lock = threading.Lock()
+        self.wanted = []
+        self.wake = threading.Event()
+        self.running = True
+        self.prefetcher = threading.Thread(target=self.prefetch_loop, daemon=True)
+        self.prefetcher.start()
+
+    def load(self, index: int):
+        # Copy out of the memory map so evicted frames release their pages
+        frame = self.reader.frame(index)
+        for key in ("pos", "vel", "radius", "color"):
+            frame[key] = np.array(frame[key])
+        return frame
+
+    def store(self, index: int, frame):
+        with self.lock:
+            self.frames[index] = frame
+            self.frames.move_to_end(index)
+            while len(self.frames) > self.capacity:
+                self.frames.popitem(last=False)
+
+    def get(self, index: int, step: float = 1.0, cursor: float = None):
+        with self.lock:
+            frame = self.frames.get(index)
+            if frame is not None:
+                self.frames.move_to_end(index)
+
+        if frame is None:
+            frame = self.load(index)
+            self.store(index, frame)
+
+        self.request_ahead(index if cursor is None else cursor, step)
+        return frame
+
+    def request_ahead(self, cursor: float, step: float):
+        # The frames playback will show next: step is how far the cursor
+        # moves per displayed frame, so fast playback skips frames in between
+        if step == 0:
+            step = 1.0
+        last = len(self.reader) - 1
+        ahead = dict.fromkeys(
+            int(cursor + step * k) for k in range(1, REPLAY_READ_AHEAD + 1)
+        )
+        ahead = [i for i in ahead if 0 <= i <= last and i != int(cursor)]
+        with self.lock:
+            self.wanted = [i for i in ahead if i not in self.frames]
+        if self.wanted:
+            self.wake.set()
+
+    def prefetch_loop(self):
+        while self.running:
+            self.wake.wait()
+            self.wake.clear()
+            while self.running:
+                with self.lock:
+                    if not self.wanted:
+                        break
+                    index = self.wanted.pop(0)
+                    if index in self.frames:
+                        continue
+                self.store(index, self.load(index))
+
+    def close(self):
+        self.running = False
+        self.wake.set()
+        self.prefetcher.join()
+
+
+class TrajectoryPlayer:
+    def __init__(self, path: str):
+        self.reader = TrajectoryReader(path)
+        self.cache = FrameCache(self.reader)
+        self.cursor = 0.0
+        self.speed = 1.0
+        # Recorded frames the cursor moved in the last advance
+        self.stride = 1.0
+        self.paused = False
+        # Recordings store the physics step; older files may not
+        self.frame_dt = self.reader.dt or 1.0 / PHYSICS_HZ
+
+    def __len__(self):
+        return len(self.reader)
+
+    @property
+    def index(self) -> int:
+        return int(self.cursor)
+
+    def advance(self, frame_dt: float):
+        if self.paused:
+            return
+        self.reader.refresh()
+        self.stride = self.speed * frame_dt / self.frame_dt
+        self.seek(self.cursor + self.stride)
+
+    def seek(self, cursor: float):
+        self.cursor = min(max(cursor, 0.0), max(len(self.reader) - 1, 0))
+
+    def step(self, frames: int):
+        self.seek(self.index + frames)
+
+    def load_into(self, simulator):
+        if len(self.reader) == 0:
+            return None
+
+        frame = self.cache.get(self.index, self.stride, self.cursor)
+        store = simulator.particles
+        store.clear()
+        count = len(frame["pos"])
+        store.spawn(
+            frame["pos"], frame["vel"], np.ones(count), frame["radius"], frame["color"]
+        )
+        simulator.time = frame["time"]
+        return frame
+
+    def close(self):
+        self.cache.close()
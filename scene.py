@@ -0,0 +1,175 @@
+import json
+import numpy as np
+from particle import Particle
+from simulator import ForceField, ParticleEmitter
+from obstacles import Obstacle
+from vector import Vector
+from config import *
+
+
+def load_scene(simulator, scene: dict):
+    settings = scene.get("settings", {})
+    current = simulator.settings
+    current.gravity_enabled = settings.get("gravity", current.gravity_enabled)
+    current.collision_enabled = settings.get("collisions", current.collision_enabled)
+    simulator.MAX_PARTICLES = settings.get("max_particles", simulator.MAX_PARTICLES)
+    current.collision_iterations = settings.get(
+        "collision_iterations", current.collision_iterations
+    )
+    current.mutual_gravity = settings.get("mutual_gravity", current.mutual_gravity)
+    current.gravity_constant = settings.get(
+        "gravity_constant", current.gravity_constant
+    )
+    current.theta = settings.get("theta", current.theta)
+    current.softening = settings.get("softening", current.softening)
+    current.sleeping = settings.get("sleeping", current.sleeping)
+    current.sleep_velocity = settings.get("sleep_velocity", current.sleep_velocity)
+    current.sleep_time = settings.get("sleep_time", current.sleep_time)
+    if "broad_phase" in settings:
+        simulator.set_broad_phase(settings["broad_phase"])
+
+    particles = scene.get("particles", [])
+    if isinstance(particles, dict):
+        load_particle_columns(simulator, particles)
+        particles = []
+
+    for data in particles:
+        particle = Particle(
+            Vector(*data["pos"]),
+            Vector(*data.get("vel", (0.0, 0.0))),
+            data.get("mass", 1.0),
+            data.get("radius", 5.0),
+        )
+        if "color" in data:
+            particle.color = tuple(data["color"])
+        if "lifetime" in data:
+            particle.lifetime = data["lifetime"]
+        simulator.add_particle(particle)
+
+    for data in scene.get("force_fields", []):
+        field = ForceField(
+            Vector(*data["pos"]),
+            data["strength"],
+            data["radius"],
+            data.get("type", "ATTRACTOR"),
+        )
+        field.active = data.get("active", True)
+        simulator.force_fields.append(field)
+
+    for data in scene.get("emitters", []):
+        emitter = ParticleEmitter(
+            pos=Vector(*data["pos"]),
+            rate=data["rate"],
+            velocity_range=tuple(data["velocity_range"]),
+            angle_range=tuple(data.get("angle_range", (0.0, 360.0))),
+            size_range=tuple(data.get("size_range", (3.0, 8.0))),
+            max_particles=data.get("max_particles", 50),
+            lifetime_range=tuple(
+                data.get("lifetime_range", (EMITTER_MIN_LIFETIME, EMITTER_MAX_LIFETIME))
+            ),
+        )
+        emitter.active = data.get("active", True)
+        emitter.timer = data.get("timer", 0.0)
+        simulator.add_emitter(emitter)
+
+    for data in scene.get("obstacles", []):
+        simulator.add_obstacle(
+            Obstacle(
+                data["shape"], data["points"], data.get("radius", OBSTACLE_THICKNESS)
+            )
+        )
+
+
+def load_particle_columns(simulator, columns: dict):
+    # The one-array-per-field form that dump_state writes
+    pos = np.array(columns["pos"], dtype=float).reshape(-1, 2)
+    n = len(pos)
+
+    def column(name, default):
+        if name not in columns:
+            return np.full(n, default, dtype=float)
+        return np.array(columns[name], dtype=float)
+
+    vel = np.array(columns.get("vel", np.zeros((n, 2))), dtype=float).reshape(-1, 2)
+    color = np.array(columns.get("color", [PARTICLE_COLOR] * n), dtype=np.uint8)
+    start = simulator.particles.active
+    count = simulator.spawn_particles(
+        pos,
+        vel,
+        column("mass", 1.0),
+        column("radius", 5.0),
+        color.reshape(-1, 3),
+        column("lifetime", np.inf),
+    )
+    simulator.particles.age[start : start + count] = column("age", 0.0)[:count]
+
+
+def load_scene_file(simulator, path: str):
+    with open(path) as f:
+        load_scene(simulator, json.load(f))
+
+
+def dump_settings(simulator) -> dict:
+    return {
+        "gravity": simulator.settings.gravity_enabled,
+        "collisions": simulator.settings.collision_enabled,
+        "max_particles": simulator.MAX_PARTICLES,
+        "collision_iterations": simulator.settings.collision_iterations,
+        "mutual_gravity": simulator.settings.mutual_gravity,
+        "gravity_constant": simulator.settings.gravity_constant,
+        "theta": simulator.settings.theta,
+        "softening": simulator.settings.softening,
+        "sleeping": simulator.settings.sleeping,
+        "sleep_velocity": simulator.settings.sleep_velocity,
+        "sleep_time": simulator.settings.sleep_time,
+        "broad_phase": simulator.broad_phase.name,
+    }
+
+
+def dump_state(simulator) -> dict:
+    store = simulator.particles
+    n = len(store)
+    return {
+        "settings": dump_settings(simulator),
+        "particles": {
+            "pos": store.pos[:n].tolist(),
+            "vel": store.vel[:n].tolist(),
+            "mass": store.mass[:n].tolist(),
+            "radius": store.radius[:n].tolist(),
+            "color": store.color[:n].tolist(),
+            "age": store.age[:n].tolist(),
+            "lifetime": store.lifetime[:n].tolist(),
+        },
+        "force_fields": [
+            {
+                "pos": [field.pos.x, field.pos.y],
+                "strength": field.strength,
+                "radius": field.radius,
+                "type": field.field_type,
+                "active": field.active,
+            }
+            for field in simulator.force_fields
+        ],
+        "emitters": [
+            {
+                "pos": [emitter.pos.x, emitter.pos.y],
+                "rate": emitter.rate,
+                "velocity_range": list(emitter.velocity_range),
+                "angle_range": list(emitter.angle_range),
+                "size_range": list(emitter.size_range),
+                "max_particles": emitter.max_particles,
+                "lifetime_range": list(emitter.lifetime_range),
+                "active": emitter.active,
+                "timer": emitter.timer,
+            }
+            for emitter in simulator.emitters
+        ],
+        "obstacles": [
+            {
+                "shape": obstacle.shape,
+                "points": obstacle.points.tolist(),
+                "radius": obstacle.radius,
+            }
+            for obstacle in simulator.obstacles
+        ],
+    }
@@ -0,0 +1,31 @@
+from config import *
+
+
+class Settings:
+    def __init__(self):
+        self.gravity_enabled = True
+        self.gravity = GRAVITY
+        self.mutual_gravity = False
+        self.gravity_constant = GRAVITY_CONSTANT
+        self.theta = BARNES_HUT_THETA
+        self.softening = GRAVITY_SOFTENING
+        self.collision_enabled = True
+        self.collision_iterations = COLLISION_ITERATIONS
+        self.restitution = RESTITUTION
+        self.sleeping = SLEEP_ENABLED
+        self.sleep_velocity = SLEEP_VELOCITY
+        self.sleep_time = SLEEP_TIME
+        self.trails_enabled = True
+        self.show_vectors = False
+        self.vector_scale = 1.0
+        # Draw at most this many particles' vectors; 0 draws all of them
+        self.vector_limit = VECTOR_MAX_ARROWS
+        self.render_mode = RENDER_MODE
+        self.heatmap_threshold = HEATMAP_THRESHOLD
+        self.heatmap_color = HEATMAP_COLOR
+
+
+def use_heatmap(settings, count: int):
+    if settings.render_mode == "auto":
+        return count > settings.heatmap_threshold
+    return settings.render_mode == "heatmap"
@@ -1,9 +1,17 @@
-import pygame
 from particle import Particle
+from particle_store import ParticleStore
+from broadphase import EMPTY_PAIRS, SpatialHash, create_broad_phase
+from kernels import create_kernels
+from collision import resolve_static
+from obstacles import ObstacleBVH, resolve_obstacles
+from sleep import SleepSystem
+from barnes_hut import QuadTree
+from profiler import Profiler
+from stats import Statistics
+from settings import Settings, use_heatmap
 from vector import Vector
 from config import *
-import random
-import math
+import numpy as np
 
 
 class ForceField:
@@ -21,7 +29,8 @@ class ForceField:
         if not self.active:
             return
 
-        diff = self.pos - particle.pos
+        pos = particle.pos
+        diff = Vector(self.pos.x - pos.x, self.pos.y - pos.y)
         dist = diff.magnitude()
 
         if dist < self.radius:
@@ -29,19 +38,35 @@ class ForceField:
             if self.field_type == "REPULSOR":
                 force_magnitude *= -1
 
-            force = diff.normalize() * force_magnitude
-            particle.apply_force(force)
+            particle.apply_force(diff.inormalize().imul(force_magnitude))
 
-    def draw(self, screen):
+    def apply_batch(self, store, indices):
+        if not self.active or len(indices) == 0:
+            return
 
-        if not self.active:
+        diff = np.array((self.pos.x, self.pos.y)) - store.pos[indices]
+        dist = np.hypot(diff[:, 0], diff[:, 1])
+        inside = dist < self.radius
+        if not inside.any():
             return
 
-        surface = pygame.Surface((self.radius * 2, self.radius * 2), pygame.SRCALPHA)
-        pygame.draw.circle(surface, self.color, (self.radius, self.radius), self.radius)
-        screen.blit(surface, (self.pos.x - self.radius, self.pos.y - self.radius))
+        indices = indices[inside]
+        diff = diff[inside]
+        dist = dist[inside]
+
+        force_magnitude = self.strength * (1 - (dist / self.radius) ** 2)
+        if self.field_type == "REPULSOR":
+            force_magnitude = -force_magnitude
+
+        scale = np.divide(
+            force_magnitude, dist, out=np.zeros_like(dist), where=dist > 0
+        )
+        store.acc[indices] += diff * (scale / store.mass[indices])[:, None]
+
+    def draw(self, screen):
+        from renderer import draw_force_field
 
-        pygame.draw.circle(screen, (255, 255, 255), self.pos.as_tuple(), 5)
+        draw_force_field(self, screen)
 
 
 class ParticleEmitter:
@@ -53,6 +78,10 @@ class ParticleEmitter:
         angle_range: tuple[float, float],
         size_range: tuple[float, float],
         max_particles: int = 50,
+        lifetime_range: tuple[float, float] = (
+            EMITTER_MIN_LIFETIME,
+            EMITTER_MAX_LIFETIME,
+        ),
     ):
         self.pos = pos
         self.rate = max(0.1, rate)
@@ -60,86 +89,143 @@ class ParticleEmitter:
         self.angle_range = angle_range
         self.size_range = size_range
         self.max_particles = max_particles
+        self.lifetime_range = lifetime_range
         self.timer = 0
         self.active = True
 
     def update(self, dt, simulator):
         if not self.active:
-            return
+            return 0
 
-        if len(simulator.particles) < self.max_particles:
-            self.timer += dt
-            spawn_interval = 1.0 / self.rate
+        if len(simulator.particles) >= self.max_particles:
+            return 0
 
-            if self.timer >= spawn_interval:
-                self.spawn_particle(simulator)
-                self.timer -= spawn_interval
+        self.timer += dt
+        spawn_interval = 1.0 / self.rate
+        owed = int(self.timer / spawn_interval)
+        if owed == 0:
+            return 0
 
-    def spawn_particle(self, simulator):
-        angle = random.uniform(self.angle_range[0], self.angle_range[1])
-        speed = random.uniform(self.velocity_range[0], self.velocity_range[1])
-        vel = Vector(1, 0).rotate(angle) * speed
+        self.timer -= owed * spawn_interval
+        room = self.max_particles - len(simulator.particles)
+        return self.spawn_batch(simulator, min(owed, room))
 
-        size = random.uniform(self.size_range[0], self.size_range[1])
-        mass = size / 5.0
-
-        particle = Particle(
-            pos=Vector(self.pos.x, self.pos.y), vel=vel, mass=mass, radius=size
-        )
-        simulator.add_particle(particle)
-
-    def draw(self, screen):
-        if not self.active:
-            return
-
-        pygame.draw.circle(screen, (200, 200, 200), self.pos.as_tuple(), 10)
-
-        pygame.draw.circle(screen, (100, 100, 100), self.pos.as_tuple(), 8)
+    def spawn_particle(self, simulator):
+        return self.spawn_batch(simulator, 1)
 
-        if abs(self.angle_range[1] - self.angle_range[0]) < 360:
-            start_angle = math.radians(self.angle_range[0])
-            end_angle = math.radians(self.angle_range[1])
+    def spawn_batch(self, simulator, count: int):
+        rng = simulator.rng
+        angle = np.radians(rng.uniform(*self.angle_range, count))
+        speed = rng.uniform(*self.velocity_range, count)
+        size = rng.uniform(*self.size_range, count)
+        lifetime = rng.uniform(*self.lifetime_range, count)
 
-            points = []
-            center = self.pos.as_tuple()
-            radius = 15
+        pos = np.empty((count, 2))
+        pos[:] = (self.pos.x, self.pos.y)
+        vel = np.stack((np.cos(angle), np.sin(angle)), axis=1) * speed[:, None]
+        colors = np.array(return_colors(), dtype=np.uint8)
+        color = colors[rng.integers(len(colors), size=count)]
 
-            points.append(center)
+        return simulator.spawn_particles(pos, vel, size / 5.0, size, color, lifetime)
 
-            for angle in range(
-                int(self.angle_range[0]), int(self.angle_range[1]) + 1, 10
-            ):
-                rad = math.radians(angle)
-                x = center[0] + radius * math.cos(rad)
-                y = center[1] + radius * math.sin(rad)
-                points.append((int(x), int(y)))
+    def draw(self, screen):
+        from renderer import draw_emitter
 
-            if len(points) > 2:
-                pygame.draw.polygon(screen, (150, 150, 150), points, 1)
+        draw_emitter(self, screen)
 
 
 class PhysicsSimulator:
-    def __init__(self, screen):
+    def __init__(
+        self, screen, broad_phase: str = BROAD_PHASE, backend: str = PHYSICS_BACKEND
+    ):
         self.screen = screen
-        self.particles = []
+        self.particles = ParticleStore()
         self.MAX_PARTICLES = 2000
-        self.gravity_enabled = True
-        self.collision_enabled = True
-        self.show_vectors = False
+        self.settings = Settings()
+        self.profiler = Profiler()
+        self.statistics = Statistics()
+        self.renderer = None
+        self.recorder = None
+        self.rng = np.random.default_rng()
         self.force_fields = []
-        self.vector_scale = 1.0
         self.emitters = []
+        self.obstacles = []
+        self.obstacle_tree = ObstacleBVH()
+        self.obstacles_changed = False
+        self.fixed_timestep = FIXED_TIMESTEP
+        self.physics_hz = PHYSICS_HZ
+        self.max_substeps = MAX_SUBSTEPS
+        self.accumulator = 0.0
+        self.time = 0.0
+        self.alpha = 1.0
+        self.last_substeps = 0
+        self.last_dropped_time = 0.0
+        self.dropped_time = 0.0
+        self.field_index = SpatialHash()
+        self.gravity_tree = QuadTree()
+        self.sleep = SleepSystem()
+        self.parallel = None
+        self.set_broad_phase(broad_phase)
+        self.set_backend(backend)
+
+    def set_broad_phase(self, name: str):
+        broad_phase = create_broad_phase(name)
+        if self.parallel is not None and name != self.broad_phase.name:
+            raise ValueError(
+                f"The {name} broad phase cannot run with parallel collision detection"
+            )
+        self.broad_phase = broad_phase
+
+    def set_backend(self, name: str):
+        self.kernels = create_kernels(name)
+
+    def start_recording(self, path: str):
+        from recording import TrajectoryRecorder
+
+        self.stop_recording()
+        self.recorder = TrajectoryRecorder(
+            path, self.MAX_PARTICLES, 1.0 / self.physics_hz
+        )
+
+    def stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def set_parallel(self, workers: int):
+        if self.parallel is not None:
+            self.parallel.close()
+            self.parallel = None
+        if workers > 0:
+            from parallel import ParallelStepper
+
+            self.parallel = ParallelStepper(self, workers)
 
     def add_particle(self, particle):
         if len(self.particles) < self.MAX_PARTICLES:
-            self.particles.append(particle)
+            self.particles.add(particle)
+
+    def spawn_particles(self, pos, vel, mass, radius, color, lifetime=np.inf):
+        count = min(len(pos), self.MAX_PARTICLES - len(self.particles))
+        if count <= 0:
+            return 0
+        if np.ndim(lifetime):
+            lifetime = lifetime[:count]
+        self.particles.spawn(
+            pos[:count],
+            vel[:count],
+            mass[:count],
+            radius[:count],
+            color[:count],
+            lifetime,
+        )
+        return count
 
     def remove_particle(self, particle):
-        if particle in self.particles:
-            self.particles.remove(particle)
+        self.particles.remove(particle)
 
     def set_vector_scale(self, scale):
-        self.vector_scale = scale
+        self.settings.vector_scale = scale
 
     def add_emitter(self, emitter):
         self.emitters.append(emitter)
@@ -148,70 +234,277 @@ class PhysicsSimulator:
         if emitter in self.emitters:
             self.emitters.remove(emitter)
 
-    def update(self, dt):
-        for particle in self.particles:
-            for emitter in self.emitters:
-                emitter.update(dt, self)
-
-            if self.gravity_enabled:
-                particle.apply_force(Vector(0, GRAVITY * particle.mass))
+    def add_obstacle(self, obstacle):
+        self.obstacles.append(obstacle)
+        self.obstacles_changed = True
+        self.sleep.wake_in_box(self.particles, *obstacle.bounds())
+
+    def clear_obstacles(self):
+        if self.obstacles:
+            self.obstacles.clear()
+            self.obstacles_changed = True
+            self.particles.wake_all()
+
+    def advance(self, frame_dt):
+        if not self.fixed_timestep:
+            self.update(frame_dt)
+            self.alpha = 1.0
+            self.last_substeps = 1
+            self.last_dropped_time = 0.0
+            return 1
+
+        step_dt = 1.0 / self.physics_hz
+        self.accumulator += frame_dt
+
+        substeps = 0
+        while self.accumulator >= step_dt and substeps < self.max_substeps:
+            self.update(step_dt)
+            self.accumulator -= step_dt
+            substeps += 1
+
+        # Spiral-of-death guard: whatever could not be simulated within
+        # max_substeps is dropped instead of carried into the next frame.
+        self.last_dropped_time = 0.0
+        if self.accumulator >= step_dt:
+            remainder = self.accumulator % step_dt
+            self.last_dropped_time = self.accumulator - remainder
+            self.dropped_time += self.last_dropped_time
+            self.accumulator = remainder
+
+        self.alpha = self.accumulator / step_dt
+        self.last_substeps = substeps
+        return substeps
 
-            for field in self.force_fields:
-                field.apply(particle)
-
-            particle.update(dt)
-
-            self.handle_boundary_collision(particle)
-
-            if self.collision_enabled:
-                for other in self.particles:
-                    if particle != other:
-                        self.check_collision(particle, other)
+    def update(self, dt):
+        particles = self.particles
+        profiler = self.profiler
+        settings = self.settings
+        sleeping = settings.sleeping and not settings.mutual_gravity
+        if not sleeping:
+            particles.wake_all()
+        # Resting contacts only stop bouncing, and piles only get the extra
+        # passes they need to settle, when they are allowed to sleep
+        resting_speed, slop = (RESTING_SPEED, CONTACT_SLOP) if sleeping else (0.0, 0.0)
+        iterations = settings.collision_iterations
+        if sleeping:
+            iterations = max(iterations, SLEEP_COLLISION_ITERATIONS)
+        particles.save_previous()
+        self.time += dt
+
+        with profiler.phase("lifetimes"):
+            particles.expire(dt)
+
+        if self.emitters:
+            with profiler.phase("emitters"):
+                for emitter in self.emitters:
+                    emitter.update(dt, self)
+
+        active_fields = [field for field in self.force_fields if field.active]
+        if sleeping:
+            with profiler.phase("sleep"):
+                self.sleep.wake_disturbed(particles, settings, active_fields)
+
+        if settings.gravity_enabled:
+            with profiler.phase("gravity"):
+                particles.apply_gravity(settings.gravity)
+
+        if settings.mutual_gravity and len(particles) > 1:
+            with profiler.phase("mutual_gravity"):
+                self.apply_mutual_gravity()
+
+        if active_fields and particles.active:
+            with profiler.phase("fields"):
+                self.apply_force_fields(active_fields)
+
+        with profiler.phase("integration"):
+            self.kernels.integrate(particles, dt)
+
+        if settings.trails_enabled:
+            with profiler.phase("trails"):
+                particles.record_trails()
+
+        with profiler.phase("boundaries"):
+            self.kernels.handle_boundaries(
+                particles,
+                WINDOW_WIDTH,
+                WINDOW_HEIGHT,
+                settings.restitution,
+                resting_speed,
+            )
+
+        on_obstacles = EMPTY_PAIRS[0]
+        if self.obstacles:
+            with profiler.phase("obstacles"):
+                on_obstacles = self.handle_obstacles(resting_speed)
+
+        first, second = EMPTY_PAIRS
+        awake, sleepers = EMPTY_PAIRS
+        if settings.collision_enabled:
+            with profiler.phase("collisions"):
+                first, second = self.find_pairs()
+                if sleeping and particles.active < len(particles):
+                    awake, sleepers = self.sleep.contacts(particles)
+                    if self.sleep.wake_on_impact(particles, awake, sleepers, settings):
+                        first, second = self.find_pairs()
+                        awake, sleepers = self.sleep.contacts(particles)
+
+                self.kernels.resolve_collisions(
+                    particles,
+                    first,
+                    second,
+                    settings.restitution,
+                    iterations,
+                    resting_speed,
+                    slop,
+                )
+                resolve_static(
+                    particles,
+                    awake,
+                    sleepers,
+                    settings.restitution,
+                    resting_speed,
+                    slop,
+                )
+
+        if sleeping:
+            with profiler.phase("sleep"):
+                resting = np.concatenate((awake, on_obstacles))
+                self.sleep.update(particles, first, second, resting, dt, settings)
+
+        if self.statistics.due(self.time):
+            with profiler.phase("statistics"):
+                self.statistics.update(self)
+
+        if self.recorder is not None:
+            with profiler.phase("recording"):
+                self.recorder.record(self)
+
+    def handle_obstacles(self, resting_speed: float = 0.0):
+        # The tree only changes with the obstacle set, not every step
+        if self.obstacles_changed:
+            self.obstacle_tree.build(self.obstacles)
+            self.obstacles_changed = False
+        return resolve_obstacles(
+            self.particles, self.obstacle_tree, self.settings.restitution, resting_speed
+        )
 
-    def draw(self):
-        for field in self.force_fields:
-            field.draw(self.screen)
+    def find_pairs(self):
+        # Candidate pairs among the awake particles
+        particles = self.particles
+        if self.parallel is not None:
+            return self.parallel.find_pairs(
+                particles.pos, particles.radius, particles.active
+            )
+        return self.kernels.find_pairs(
+            self.broad_phase, particles.pos, particles.radius, particles.active
+        )
 
-        for emitter in self.emitters:
-            emitter.draw(self.screen)
+    def apply_mutual_gravity(self):
+        particles = self.particles
+        settings = self.settings
+        n = len(particles)
+        self.gravity_tree.build(particles.pos, particles.mass, n)
+        particles.acc[:n] += self.kernels.tree_gravity(
+            self.gravity_tree,
+            settings.gravity_constant,
+            settings.theta,
+            settings.softening,
+        )
 
-        for particle in self.particles:
-            particle.draw(self.screen, self.show_vectors)
+    def apply_force_fields(self, fields):
+        particles = self.particles
+        index = self.field_index
+        # Cells as large as the biggest field keep each query to a few cells
+        cell_size = max(field.radius for field in fields)
+        index.rebuild(particles.pos, particles.radius, particles.active, cell_size)
+
+        for field in fields:
+            candidates = index.query_circle(field.pos.x, field.pos.y, field.radius)
+            field.apply_batch(particles, candidates)
+
+    def draw(self, frame=None):
+        # Draws the live state, or a pipeline.Frame copied out of it
+        if self.renderer is None:
+            from renderer import Renderer
+
+            self.renderer = Renderer()
+
+        source = self if frame is None else frame
+        settings = source.settings
+        particles = source.particles
+        with self.profiler.phase("rendering"):
+            positions = particles.interpolated_positions(source.alpha)
+            if use_heatmap(settings, particles.count):
+                self.renderer.draw_heatmap(
+                    self.screen, particles, positions, settings.heatmap_color
+                )
+                self.renderer.draw_overlays(
+                    self.screen, source.force_fields, source.emitters
+                )
+                self.renderer.draw_obstacles(self.screen, source.obstacles)
+                self.renderer.reset_trails()
+                return
+
+            self.renderer.draw_overlays(
+                self.screen, source.force_fields, source.emitters
+            )
+            self.renderer.draw_obstacles(self.screen, source.obstacles)
+
+            if settings.trails_enabled:
+                self.renderer.draw_trails(self.screen, particles)
+            else:
+                self.renderer.reset_trails()
+
+            self.renderer.draw_particles(self.screen, particles, positions)
+
+            if settings.show_vectors:
+                self.renderer.draw_vectors(
+                    self.screen,
+                    particles,
+                    positions,
+                    settings.vector_scale,
+                    settings.vector_limit,
+                )
 
     def handle_boundary_collision(self, particle):
-        if particle.pos.y + particle.radius > WINDOW_HEIGHT:
-            particle.pos.y = WINDOW_HEIGHT - particle.radius
-            particle.vel.y *= -RESTITUTION
+        pos = particle.pos
+        vel = particle.vel
+        radius = particle.radius
 
-        if particle.pos.y - particle.radius < 0:
-            particle.pos.y = particle.radius
-            particle.vel.y *= -RESTITUTION
+        if pos.y + radius > WINDOW_HEIGHT:
+            pos.y = WINDOW_HEIGHT - radius
+            vel.y *= -self.settings.restitution
 
-        if particle.pos.x + particle.radius > WINDOW_WIDTH:
-            particle.pos.x = WINDOW_WIDTH - particle.radius
-            particle.vel.x *= -RESTITUTION
+        if pos.y - radius < 0:
+            pos.y = radius
+            vel.y *= -self.settings.restitution
 
-        if particle.pos.x - particle.radius < 0:
-            particle.pos.x = particle.radius
-            particle.vel.x *= -RESTITUTION
+        if pos.x + radius > WINDOW_WIDTH:
+            pos.x = WINDOW_WIDTH - radius
+            vel.x *= -self.settings.restitution
+
+        if pos.x - radius < 0:
+            pos.x = radius
+            vel.x *= -self.settings.restitution
 
     def check_collision(self, p1, p2):
-        diff = p2.pos - p1.pos
+        pos1 = p1.pos
+        pos2 = p2.pos
+        diff = Vector(pos2.x - pos1.x, pos2.y - pos1.y)
         dist = diff.magnitude()
 
         if dist < p1.radius + p2.radius:
-            normal = diff.normalize()
-            relative_vel = p2.vel - p1.vel
+            normal = diff.inormalize()
+            vel1 = p1.vel
+            vel2 = p2.vel
+            relative_vel = Vector(vel2.x - vel1.x, vel2.y - vel1.y)
 
-            j = -(1 + RESTITUTION) * relative_vel.dot(normal)
+            j = -(1 + self.settings.restitution) * relative_vel.dot(normal)
             j /= 1 / p1.mass + 1 / p2.mass
 
-            impulse = normal * j
-            p1.vel -= impulse / p1.mass
-            p2.vel += impulse / p2.mass
+            vel1.add_scaled(normal, -j / p1.mass)
+            vel2.add_scaled(normal, j / p2.mass)
 
             overlap = (p1.radius + p2.radius - dist) / 2.0
-            separation = normal * overlap
-
-            p1.pos -= separation
-            p2.pos += separation
+            pos1.add_scaled(normal, -overlap)
+            pos2.add_scaled(normal, overlap)
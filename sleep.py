@@ -0,0 +1,142 @@
+import numpy as np
+from broadphase import SpatialHash, EMPTY_PAIRS, expand_ranges
+from config import *
+
+
+class SleepSystem:
+    def __init__(self):
+        # Spatial hash over the sleeping particles only; it is rebuilt when
+        # the sleeping set changes rather than every step.
+        self.index = SpatialHash()
+        self.version = None
+        self.gravity = None
+
+    def refresh_index(self, store):
+        if self.version == store.sleep_version:
+            return
+        self.version = store.sleep_version
+        n = store.count
+        active = store.active
+        max_radius = float(store.radius[:n].max()) if n else 1.0
+        self.index.rebuild(
+            store.pos[active:n],
+            store.radius[active:n],
+            n - active,
+            max(2.0 * max_radius, 1e-6),
+        )
+
+    def sleepers_near(self, store, points, radii, margin: float = 0.0):
+        self.refresh_index(store)
+        owner, ranks = self.index.query_neighbors(points)
+        sleepers = ranks + store.active
+        diff = store.pos[sleepers] - points[owner]
+        reach = radii[owner] + store.radius[sleepers] + margin
+        touching = np.einsum("ij,ij->i", diff, diff) < reach * reach
+        return owner[touching], sleepers[touching]
+
+    def wake_disturbed(self, store, settings, fields):
+        if store.active == store.count:
+            store.removed_points.clear()
+            self.gravity = settings.gravity_enabled
+            return 0
+
+        # Sleepers only rest under the gravity they fell asleep in
+        if self.gravity is not None and self.gravity != settings.gravity_enabled:
+            store.removed_points.clear()
+            self.gravity = settings.gravity_enabled
+            return store.wake_all()
+        self.gravity = settings.gravity_enabled
+
+        woken = []
+        # Whatever rested on a removed particle lost its support
+        for points, radii in store.removed_points:
+            woken.append(self.sleepers_near(store, points, radii, SLEEP_MARGIN)[1])
+        store.removed_points.clear()
+
+        for field in fields:
+            point = np.array([[field.pos.x, field.pos.y]])
+            woken.append(self.sleepers_near(store, point, np.array([field.radius]))[1])
+
+        if not woken:
+            return 0
+        return store.wake(np.concatenate(woken))
+
+    def wake_in_box(self, store, low, high):
+        pos = store.pos[store.active : store.count]
+        reach = store.radius[store.active : store.count, None]
+        inside = np.all((pos + reach >= low) & (pos - reach <= high), axis=1)
+        return store.wake(np.flatnonzero(inside) + store.active)
+
+    def contacts(self, store):
+        # Awake particles touching sleeping ones
+        if store.active == 0 or store.active == store.count:
+            return EMPTY_PAIRS
+        active = store.active
+        return self.sleepers_near(
+            store, store.pos[:active], store.radius[:active], SLEEP_MARGIN
+        )
+
+    def wake_on_impact(self, store, awake, sleepers, settings):
+        diff = store.pos[sleepers] - store.pos[awake]
+        dist = np.hypot(diff[:, 0], diff[:, 1])
+        closing = np.einsum("ij,ij->i", store.vel[awake], diff)
+        fast = closing > settings.sleep_velocity * np.maximum(dist, 1e-9)
+        return store.wake(sleepers[fast])
+
+    def supported(self, store, resting):
+        # Resting on a wall, or on whatever the resting particles touch
+        active = store.active
+        pos = store.pos[:active]
+        reach = store.radius[:active] + SLEEP_MARGIN
+        supported = (
+            (pos[:, 0] < reach)
+            | (pos[:, 1] < reach)
+            | (pos[:, 0] > WINDOW_WIDTH - reach)
+            | (pos[:, 1] > WINDOW_HEIGHT - reach)
+        )
+        supported[resting] = True
+        return supported
+
+    def update(self, store, first, second, resting, dt, settings):
+        # Speeds are averaged over the whole sleep_time from the distance
+        # moved since the timer started: contact correction moves particles
+        # without touching their velocity, and deep in a pile it shuffles
+        # them by more than sleep_velocity allows in any single step.
+        active = store.active
+        pos = store.pos[:active]
+        rest_pos = store.rest_pos[:active]
+        drift = pos - rest_pos
+        reach = settings.sleep_velocity * settings.sleep_time
+        slow = np.einsum("ij,ij->i", drift, drift) < reach * reach
+        timer = store.sleep_time[:active]
+        timer[:] = np.where(slow, timer + dt, 0.0)
+        rest_pos[~slow] = pos[~slow]
+        sleepy = timer >= settings.sleep_time
+        if not sleepy.any():
+            return 0
+
+        # Sleep spreads from whatever rests on something that cannot move (a
+        # wall, an obstacle or a sleeper) through touching slow particles, so
+        # piles freeze from the bottom up and free-flying particles never do.
+        diff = store.pos[second] - store.pos[first]
+        reach = store.radius[first] + store.radius[second] + SLEEP_MARGIN
+        touching = np.einsum("ij,ij->i", diff, diff) < reach * reach
+        i = first[touching]
+        j = second[touching]
+        source = np.concatenate((i, j))
+        target = np.concatenate((j, i))
+        order = np.argsort(source, kind="stable")
+        target = target[order]
+        degree = np.bincount(source, minlength=active)
+        starts = np.cumsum(degree) - degree
+
+        asleep = sleepy & self.supported(store, resting)
+        frontier = np.flatnonzero(asleep)
+        while len(frontier):
+            _, edges = expand_ranges(frontier, starts[frontier], degree[frontier])
+            reached = target[edges]
+            reached = np.unique(reached[sleepy[reached] & ~asleep[reached]])
+            asleep[reached] = True
+            frontier = reached
+
+        return store.sleep(np.flatnonzero(asleep))
@@ -0,0 +1,95 @@
+import json
+import random
+import numpy as np
+from scene import dump_settings, dump_state, load_scene
+
+SNAPSHOT_VERSION = 1
+
+
+def save_snapshot(simulator, path: str):
+    store = simulator.particles
+    n = len(store)
+    state = dump_state(simulator)
+    meta = {
+        "version": SNAPSHOT_VERSION,
+        "settings": dump_settings(simulator),
+        "force_fields": state["force_fields"],
+        "emitters": state["emitters"],
+        "obstacles": state["obstacles"],
+        "flags": {
+            "show_vectors": simulator.settings.show_vectors,
+            "trails_enabled": simulator.settings.trails_enabled,
+            "fixed_timestep": simulator.fixed_timestep,
+            "physics_hz": simulator.physics_hz,
+            "max_substeps": simulator.max_substeps,
+            "vector_scale": simulator.settings.vector_scale,
+        },
+        "clock": {
+            "time": simulator.time,
+            "accumulator": simulator.accumulator,
+            "dropped_time": simulator.dropped_time,
+        },
+        "trail_head": store.trail_head,
+        "active": store.active,
+        "rng": simulator.rng.bit_generator.state,
+        "random": random.getstate(),
+    }
+
+    arrays = {name: getattr(store, name)[:n] for name in store.FIELDS}
+    with open(path, "wb") as f:
+        np.savez(f, meta=np.array(json.dumps(meta)), **arrays)
+
+
+def load_snapshot(simulator, path: str):
+    with np.load(path) as data:
+        meta = json.loads(str(data["meta"]))
+        if meta["version"] != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version: {meta['version']}")
+        arrays = {
+            name: data[name] for name in simulator.particles.FIELDS if name in data
+        }
+
+    simulator.particles.clear()
+    simulator.force_fields.clear()
+    simulator.emitters.clear()
+    simulator.clear_obstacles()
+    load_scene(
+        simulator,
+        {
+            "settings": meta["settings"],
+            "force_fields": meta["force_fields"],
+            "emitters": meta["emitters"],
+            "obstacles": meta.get("obstacles", []),
+        },
+    )
+
+    store = simulator.particles
+    n = len(arrays["pos"])
+    start = store.add_slots(n)
+    for name, values in arrays.items():
+        if name == "trail" and values.shape[1:] != store.trail.shape[1:]:
+            continue
+        getattr(store, name)[start : start + n] = values
+    store.recount_mass()
+    store.trail_head = meta["trail_head"] % max(store.trail_length, 1)
+    # Slots are saved in order, so the sleeping tail is restored as is
+    store.active = start + meta.get("active", n)
+    store.sleep_version += 1
+
+    flags = meta["flags"]
+    simulator.settings.show_vectors = flags["show_vectors"]
+    simulator.settings.trails_enabled = flags["trails_enabled"]
+    simulator.fixed_timestep = flags["fixed_timestep"]
+    simulator.physics_hz = flags["physics_hz"]
+    simulator.max_substeps = flags["max_substeps"]
+    simulator.settings.vector_scale = flags["vector_scale"]
+
+    clock = meta["clock"]
+    simulator.time = clock["time"]
+    simulator.accumulator = clock["accumulator"]
+    simulator.dropped_time = clock["dropped_time"]
+    simulator.statistics.reset()
+
+    simulator.rng.bit_generator.state = meta["rng"]
+    version, internal, gauss = meta["random"]
+    random.setstate((version, tuple(internal), gauss))
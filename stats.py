@@ -0,0 +1,110 @@
+import numpy as np
+from barnes_hut import QuadTree
+from config import *
+
+
+class Statistics:
+    def __init__(self, refresh_hz: float = STATS_REFRESH_HZ):
+        self.refresh_hz = refresh_hz
+        self.last_time = -np.inf
+        # Bumped on every sample so readers can skip unchanged values
+        self.version = 0
+        self.count = 0
+        self.sleeping = 0
+        self.avg_speed = 0.0
+        self.max_speed = 0.0
+        self.total_mass = 0.0
+        self.avg_mass = 0.0
+        self.kinetic_energy = 0.0
+        self.potential_energy = 0.0
+        self.total_energy = 0.0
+        self.momentum = (0.0, 0.0)
+        self.energy_drift = 0.0
+        self.reference_energy = 0.0
+        self.reference_key = None
+        self.gravity_tree = QuadTree()
+
+    def due(self, time: float) -> bool:
+        if self.refresh_hz <= 0:
+            return True
+        # Time runs backwards after a snapshot or replay frame is loaded
+        if time < self.last_time:
+            return True
+        return time - self.last_time >= 1.0 / self.refresh_hz
+
+    def reset(self):
+        # Sample at the next step and start a new drift reference
+        self.last_time = -np.inf
+        self.reference_key = None
+
+    def update(self, simulator):
+        store = simulator.particles
+        n = store.count
+        vel = store.vel[:n]
+        mass = store.mass[:n]
+
+        speed_sq = np.einsum("ij,ij->i", vel, vel)
+        speed = np.sqrt(speed_sq)
+        self.count = n
+        self.sleeping = n - store.active
+        self.avg_speed = float(speed.mean()) if n else 0.0
+        self.max_speed = float(speed.max()) if n else 0.0
+        self.total_mass = store.total_mass
+        self.avg_mass = self.total_mass / n if n else 0.0
+        self.kinetic_energy = 0.5 * float(mass @ speed_sq)
+        px, py = mass @ vel if n else (0.0, 0.0)
+        self.momentum = (float(px), float(py))
+
+        self.potential_energy = 0.0
+        if simulator.settings.gravity_enabled and n:
+            # Height of each particle above the resting position on the floor
+            height = WINDOW_HEIGHT - store.radius[:n] - store.pos[:n, 1]
+            gravity = simulator.settings.gravity
+            self.potential_energy = gravity * float(mass @ height)
+        settings = simulator.settings
+        if settings.mutual_gravity and n > 1:
+            self.gravity_tree.build(store.pos, store.mass, n)
+            self.potential_energy += self.gravity_tree.potential_energy(
+                settings.gravity_constant, settings.theta, settings.softening
+            )
+        self.total_energy = self.kinetic_energy + self.potential_energy
+
+        # Drift is only meaningful while the same particles are simulated
+        # under the same forces, so any change restarts the reference.
+        key = (
+            n,
+            self.total_mass,
+            settings.gravity_enabled,
+            settings.mutual_gravity,
+            settings.gravity_constant,
+            settings.softening,
+        )
+        if key != self.reference_key:
+            self.reference_key = key
+            self.reference_energy = self.total_energy
+        self.energy_drift = 0.0
+        if self.reference_energy:
+            self.energy_drift = (self.total_energy - self.reference_energy) / abs(
+                self.reference_energy
+            )
+
+        self.last_time = simulator.time
+        self.version += 1
+
+    def momentum_magnitude(self) -> float:
+        return float(np.hypot(*self.momentum))
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sleeping": self.sleeping,
+            "avg_speed": self.avg_speed,
+            "max_speed": self.max_speed,
+            "total_mass": self.total_mass,
+            "avg_mass": self.avg_mass,
+            "kinetic_energy": self.kinetic_energy,
+            "potential_energy": self.potential_energy,
+            "total_energy": self.total_energy,
+            "momentum": list(self.momentum),
+            "energy_drift": self.energy_drift,
+        }
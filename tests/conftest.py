@@ -0,0 +1,68 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# The modules live flat in the repository root
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from config import WINDOW_HEIGHT, WINDOW_WIDTH  # noqa: E402
+from simulator import PhysicsSimulator  # noqa: E402
+
+
+@pytest.fixture
+def make_simulator():
+    def make_simulator(seed: int = 0):
+        simulator = PhysicsSimulator(None)
+        simulator.rng = np.random.default_rng(seed)
+        return simulator
+
+    return make_simulator
+
+
+@pytest.fixture
+def spawn():
+    def spawn(simulator, pos, vel, radius: float = 5.0):
+        pos = np.array(pos, dtype=float).reshape(-1, 2)
+        n = len(pos)
+        return simulator.spawn_particles(
+            pos,
+            np.array(vel, dtype=float).reshape(-1, 2),
+            np.ones(n),
+            np.full(n, radius),
+            np.full((n, 3), 200),
+        )
+
+    return spawn
+
+
+@pytest.fixture
+def make_gas(make_simulator, spawn):
+    # Particles scattered over the whole window at random speeds, without
+    # gravity
+    def make_gas(n: int, seed: int = 0, speed: float = 150.0, radius: float = 4.0):
+        simulator = make_simulator(seed)
+        simulator.settings.gravity_enabled = False
+        rng = np.random.default_rng(seed)
+        low = (radius, radius)
+        high = (WINDOW_WIDTH - radius, WINDOW_HEIGHT - radius)
+        spawn(
+            simulator,
+            rng.uniform(low, high, (n, 2)),
+            rng.uniform(-speed, speed, (n, 2)),
+            radius,
+        )
+        return simulator
+
+    return make_gas
+
+
+@pytest.fixture
+def run():
+    def run(simulator, seconds: float, dt: float = 1 / 60):
+        for _ in range(int(round(seconds / dt))):
+            simulator.update(dt)
+
+    return run
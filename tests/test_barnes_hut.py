@@ -0,0 +1,23 @@
+import numpy as np
+from barnes_hut import QuadTree
+
+
+def test_tree_potential_energy_matches_direct_sum():
+    rng = np.random.default_rng(0)
+    n = 800
+    pos = rng.normal(400.0, 80.0, (n, 2))
+    mass = rng.uniform(0.5, 2.0, n)
+    gravity_constant, softening = 1000.0, 5.0
+
+    diff = pos[:, None] - pos[None]
+    r = np.sqrt((diff**2).sum(axis=-1) + softening**2)
+    np.fill_diagonal(r, np.inf)
+    direct = -0.5 * gravity_constant * float((mass[:, None] * mass[None] / r).sum())
+
+    tree = QuadTree()
+    tree.build(pos, mass, n)
+    # theta 0 opens every node, so only the summation order differs
+    exact = tree.potential_energy(gravity_constant, 0.0, softening)
+    assert abs(exact / direct - 1) < 1e-9
+    estimate = tree.potential_energy(gravity_constant, 0.5, softening)
+    assert abs(estimate / direct - 1) < 0.01
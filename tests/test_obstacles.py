@@ -0,0 +1,30 @@
+from obstacles import Obstacle
+
+
+def wall(make_simulator):
+    simulator = make_simulator()
+    simulator.add_obstacle(Obstacle("SEGMENT", [(200, 300), (400, 300)], 2.0))
+    return simulator
+
+
+def test_particle_crossing_a_thin_wall_is_pushed_back(make_simulator, spawn):
+    simulator = wall(make_simulator)
+    spawn(simulator, (300.0, 297.0), (0.0, 540.0))
+    simulator.update(1 / 60)
+
+    store = simulator.particles
+    assert store.pos[0, 1] == 293.0
+    assert store.vel[0, 1] < 0.0
+
+
+def test_particle_passing_an_end_cap_is_not_snapped_onto_the_face(
+    make_simulator, spawn
+):
+    simulator = wall(make_simulator)
+    spawn(simulator, (403.0, 297.0), (0.0, 480.0))
+    simulator.update(1 / 60)
+
+    store = simulator.particles
+    assert store.pos[0, 1] > 300.0
+    assert store.vel[0, 1] > 0.0
+    assert store.pos[0, 0] > 400.0
@@ -0,0 +1,55 @@
+import numpy as np
+
+
+def test_store_grows_while_the_worker_pool_is_live(make_gas, spawn):
+    simulator = make_gas(100)
+    simulator.set_parallel(2)
+    try:
+        simulator.update(1 / 60)
+        store = simulator.particles
+        kept = store.pos[:100].copy()
+        capacity = store.capacity
+
+        rng = np.random.default_rng(1)
+        spawn(simulator, rng.uniform(10, 590, (400, 2)), np.zeros((400, 2)))
+        assert store.capacity > capacity
+        assert np.array_equal(store.pos[:100], kept)
+        simulator.update(1 / 60)
+        assert len(store) == 500
+    finally:
+        simulator.set_parallel(0)
+
+
+def test_parallel_candidates_match_the_serial_search(make_gas):
+    simulator = make_gas(600, speed=300.0)
+    store = simulator.particles
+    n = store.active
+    serial = simulator.broad_phase.find_pairs(store.pos, store.radius, n)
+    simulator.set_parallel(3)
+    try:
+        parallel = simulator.find_pairs()
+    finally:
+        simulator.set_parallel(0)
+    assert np.array_equal(parallel[0], serial[0])
+    assert np.array_equal(parallel[1], serial[1])
+
+
+def test_parallel_steps_match_serial_steps(make_gas):
+    states = []
+    for workers in (0, 2):
+        simulator = make_gas(400, speed=300.0)
+        simulator.settings.gravity_enabled = True
+        simulator.settings.sleeping = True
+        simulator.settings.collision_iterations = 3
+        simulator.set_parallel(workers)
+        try:
+            for _ in range(60):
+                simulator.update(1 / 60)
+        finally:
+            simulator.set_parallel(0)
+        store = simulator.particles
+        states.append((store.pos[: store.count].copy(), store.active))
+
+    (serial_pos, serial_active), (parallel_pos, parallel_active) = states
+    assert parallel_active == serial_active
+    assert np.array_equal(parallel_pos, serial_pos)
@@ -0,0 +1,10 @@
+import pytest
+
+pytest.importorskip("numba")
+
+from benchmark import SCENES, check_parity  # noqa: E402
+
+
+@pytest.mark.parametrize("scene", SCENES)
+def test_numba_matches_numpy(scene):
+    assert check_parity([scene], [100], 30, 1 / 60, 0) == []
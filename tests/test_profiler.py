@@ -0,0 +1,48 @@
+import threading
+
+from profiler import Profiler
+
+
+def test_threads_time_into_their_own_frames():
+    profiler = Profiler(enabled=True)
+    stop = threading.Event()
+    errors = []
+
+    def physics():
+        try:
+            while not stop.is_set():
+                with profiler.phase("collisions"):
+                    pass
+                profiler.end_frame()
+        except BaseException as error:
+            errors.append(error)
+            raise
+
+    worker = threading.Thread(target=physics)
+    worker.start()
+    try:
+        for _ in range(20000):
+            with profiler.phase("rendering"):
+                pass
+            profiler.end_frame(trace=False)
+    finally:
+        stop.set()
+        worker.join()
+
+    assert not errors
+    frames = [phases for _, phases in profiler.trace]
+    assert frames
+    assert all("rendering" not in phases for phases in frames)
+    assert all(set(phases) == {"collisions", "total"} for phases in frames)
+    assert set(profiler.summary()) == {"collisions", "rendering", "total"}
+
+
+def test_reset_drops_open_frames():
+    profiler = Profiler(enabled=True)
+    with profiler.phase("collisions"):
+        pass
+    profiler.reset()
+    profiler.end_frame()
+
+    _, phases = profiler.trace[0]
+    assert phases == {"total": 0.0}
@@ -0,0 +1,25 @@
+from recording import TrajectoryRecorder
+from replay import TrajectoryPlayer
+
+
+def test_player_steps_through_a_recording(make_gas, tmp_path):
+    simulator = make_gas(20)
+    path = str(tmp_path / "run.traj")
+    recorder = TrajectoryRecorder(path, 20, 1 / 60)
+    for _ in range(10):
+        simulator.update(1 / 60)
+        recorder.record(simulator)
+    recorder.close()
+
+    player = TrajectoryPlayer(path)
+    try:
+        player.advance(1 / 60)
+        assert player.index == 1
+        player.step(1)
+        assert player.index == 2
+        player.step(-1)
+        assert player.index == 1
+        frame = player.load_into(simulator)
+        assert frame["frame"] == 1
+    finally:
+        player.close()
@@ -0,0 +1,28 @@
+import json
+from pathlib import Path
+import numpy as np
+from scene import dump_state, load_scene, load_scene_file
+
+SCENES = Path(__file__).resolve().parent.parent / "scenes"
+
+
+def test_dumped_state_loads_back(make_simulator, run):
+    simulator = make_simulator()
+    load_scene_file(simulator, str(SCENES / "fountain.json"))
+    run(simulator, 1.0, 1 / 120)
+
+    # Through JSON, like headless.py --output
+    state = json.loads(json.dumps(dump_state(simulator)))
+    restored = make_simulator()
+    load_scene(restored, state)
+
+    source = simulator.particles
+    target = restored.particles
+    n = len(source)
+    assert n > 2
+    assert len(target) == n
+    for name in ("pos", "vel", "mass", "radius", "color", "age", "lifetime"):
+        assert np.array_equal(getattr(target, name)[:n], getattr(source, name)[:n])
+    assert len(restored.force_fields) == len(simulator.force_fields)
+    assert len(restored.emitters) == len(simulator.emitters)
+    assert dump_state(restored)["particles"] == state["particles"]
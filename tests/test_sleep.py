@@ -0,0 +1,52 @@
+import numpy as np
+from config import RESTITUTION, WINDOW_HEIGHT
+
+
+def pile(simulator, spawn, layers: int, r: float = 5.0):
+    # Staggered layers resting on the floor
+    pos = []
+    for row in range(layers):
+        y = WINDOW_HEIGHT - r - row * 2 * r * 0.87
+        for k in range(75 - row % 2):
+            pos.append((r + 0.2 + (r if row % 2 else 0) + k * (2 * r + 0.5), y))
+    spawn(simulator, pos, np.zeros((len(pos), 2)), r)
+
+
+def test_isolated_slow_particle_stays_awake(make_simulator, spawn, run):
+    simulator = make_simulator()
+    simulator.settings.sleeping = True
+    simulator.settings.gravity_enabled = False
+    spawn(simulator, (400.0, 300.0), (30.0, 0.0))
+    run(simulator, 2.0)
+
+    store = simulator.particles
+    assert store.active == 1
+    assert np.allclose(store.vel[0], (30.0, 0.0))
+    assert np.allclose(store.pos[0], (460.0, 300.0))
+
+
+def test_settled_pile_sleeps_with_default_settings(make_simulator, spawn, run):
+    simulator = make_simulator()
+    simulator.settings.sleeping = True
+    pile(simulator, spawn, 9)
+    run(simulator, 3.0)
+
+    assert simulator.particles.active == 0
+
+
+def test_deep_pile_sleeps_with_default_settings(make_simulator, spawn, run):
+    simulator = make_simulator()
+    simulator.settings.sleeping = True
+    pile(simulator, spawn, 12)
+    run(simulator, 6.0)
+
+    assert simulator.particles.active == 0
+
+
+def test_resting_contacts_bounce_without_sleeping(make_simulator, spawn):
+    # The resting cutoff only applies while sleeping is on
+    simulator = make_simulator()
+    simulator.settings.gravity_enabled = False
+    spawn(simulator, (400.0, WINDOW_HEIGHT - 5.1), (0.0, 20.0))
+    simulator.update(1 / 60)
+    assert simulator.particles.vel[0, 1] == -20.0 * RESTITUTION
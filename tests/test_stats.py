@@ -0,0 +1,21 @@
+from snapshot import save_snapshot, load_snapshot
+
+
+def test_statistics_resume_after_rewinding_to_a_snapshot(make_gas, run, tmp_path):
+    simulator = make_gas(50)
+    path = str(tmp_path / "snapshot.npz")
+    run(simulator, 1.0, 1 / 120)
+    save_snapshot(simulator, path)
+    run(simulator, 5.0, 1 / 120)
+
+    load_snapshot(simulator, path)
+    version = simulator.statistics.version
+    run(simulator, 0.5, 1 / 120)
+    assert simulator.statistics.version > version + 1
+    assert simulator.statistics.last_time <= simulator.time
+
+
+def test_statistics_are_due_when_time_goes_backwards(make_gas):
+    statistics = make_gas(10).statistics
+    statistics.last_time = 10.0
+    assert statistics.due(1.0)
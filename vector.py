@@ -1,8 +1,26 @@
 import math
+from functools import lru_cache
 from typing import Union
 
 
+class Rotation:
+    __slots__ = ("angle", "cos", "sin")
+
+    def __init__(self, angle: float):
+        rad = math.radians(angle)
+        self.angle = angle
+        self.cos = math.cos(rad)
+        self.sin = math.sin(rad)
+
+
+@lru_cache(maxsize=512)
+def rotation(angle: float) -> Rotation:
+    return Rotation(angle)
+
+
 class Vector:
+    __slots__ = ("x", "y")
+
     def __init__(self, x: Union[int, float] = 0, y: Union[int, float] = 0):
         self.x = float(x)
         self.y = float(y)
@@ -23,7 +41,10 @@ class Vector:
         return Vector(self.x / scalar, self.y / scalar)
 
     def magnitude(self) -> float:
-        return math.sqrt(self.x**2 + self.y**2)
+        return math.sqrt(self.x * self.x + self.y * self.y)
+
+    def magnitude_sq(self) -> float:
+        return self.x * self.x + self.y * self.y
 
     def normalize(self):
         mag = self.magnitude()
@@ -35,12 +56,79 @@ class Vector:
         return self.x * other.x + self.y * other.y
 
     def rotate(self, angle: float):
-        rad = math.radians(angle)
-        cos_a = math.cos(rad)
-        sin_a = math.sin(rad)
-        x = self.x * cos_a - self.y * sin_a
-        y = self.x * sin_a + self.y * cos_a
-        return Vector(x, y)
+        return self.rotate_by(rotation(angle))
+
+    def rotate_by(self, rot: Rotation):
+        x, y = self.x, self.y
+        return Vector(x * rot.cos - y * rot.sin, x * rot.sin + y * rot.cos)
+
+    def copy(self):
+        return Vector(self.x, self.y)
+
+    def set(self, x: float, y: float):
+        self.x = x
+        self.y = y
+        return self
+
+    def iadd(self, other):
+        self.x += other.x
+        self.y += other.y
+        return self
+
+    def isub(self, other):
+        self.x -= other.x
+        self.y -= other.y
+        return self
+
+    def imul(self, scalar: float):
+        self.x *= scalar
+        self.y *= scalar
+        return self
+
+    def add_scaled(self, other, scale: float):
+        self.x += other.x * scale
+        self.y += other.y * scale
+        return self
+
+    def inormalize(self):
+        mag = self.magnitude()
+        if mag == 0:
+            return self.set(0.0, 0.0)
+        return self.imul(1.0 / mag)
+
+    def irotate(self, rot: Rotation):
+        x, y = self.x, self.y
+        self.x = x * rot.cos - y * rot.sin
+        self.y = x * rot.sin + y * rot.cos
+        return self
 
     def as_tuple(self) -> tuple[int, int]:
         return (int(self.x), int(self.y))
+
+
+class ArrayVector(Vector):
+    __slots__ = ("_array", "_index")
+
+    def __init__(self, array, index: int):
+        self._array = array
+        self._index = index
+
+    @property
+    def x(self):
+        return float(self._array[self._index, 0])
+
+    @x.setter
+    def x(self, value):
+        self._array[self._index, 0] = value
+
+    @property
+    def y(self):
+        return float(self._array[self._index, 1])
+
+    @y.setter
+    def y(self, value):
+        self._array[self._index, 1] = value
+
+    def set(self, x: float, y: float):
+        self._array[self._index] = (x, y)
+        return self